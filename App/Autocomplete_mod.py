@@ -7,13 +7,19 @@ import time
 import sys
 import pickle
 import os
+import re
+import bisect
+import heapq
+from multiprocessing import Pool
 
 # Ensure nltk data is available (if necessary, uncomment the download line)
 # try:
 #     nltk.data.find('tokenizers/punkt')
 # except nltk.downloader.DownloadError:
 #     nltk.download('punkt')
-from nltk.tokenize import word_tokenize
+from nltk.tokenize import word_tokenize, sent_tokenize, NLTKWordTokenizer
+from functools import lru_cache
+from Metrics_mod import StageTimer
 
 
 # --- CONFIGURATION ---
@@ -24,33 +30,139 @@ MODEL_FILE = r"Autocorrect-Autocomplete-for-typing/App/data/autocomplete_model_d
 # Use a raw string for the file path to avoid 'invalid escape sequence' warnings/errors on Windows.
 # NOTE: You should update this path to where your 'AllCombined.txt' file is located.
 TRAIN_DATA_PATH = r"Autocorrect-Autocomplete-for-typing/App/data/AllCombined.txt"
+# Raw (pre-threshold) counts written by training, mergeable with other runs' (see Merge_mod.py); None = off
+COUNTS_FILE = None
+# Prefix index: prefixes up to this length keep a cached list of their most frequent words
+PREFIX_CACHE_DEPTH = 2
+PREFIX_CACHE_SIZE = 20
+# Training worker processes (None = one per CPU) and byte-range shards handed to each of them
+TRAIN_PROCESSES = None
+SHARDS_PER_PROCESS = 4
+# N-gram counting at training time: "parallel" (in memory, across TRAIN_PROCESSES), "external"
+# (one process, spilling sorted runs to disk above COUNT_MEMORY_MB; see ExternalCount_mod.py) or
+# "sketch" (approximate counts in fixed memory, rare N-grams dropped; see Sketch_mod.py)
+COUNTING_MODE = "parallel"
+COUNT_MEMORY_MB = 1024
+
+# Tokenizer used by tokenize_sentences: "nltk" (word_tokenize) or "fast" (fast_word_tokenize, same tokens)
+TOKENIZER_MODE = "nltk"
+# Scorer used by NGramModel.suggest: "laplace" (get_suggestions) or "backoff" (suggest_backoff)
+SUGGESTION_SCORER = "laplace"
+# Stupid-backoff penalty applied per order backed off
+BACKOFF_ALPHA = 0.4
+# Completions under a prefix with at most this many words look those words up instead of scanning continuations
+PREFIX_LOOKUPS = 200
+# Pruning at training time: smallest count kept per N-gram order ({} = keep all), and the smallest
+# weighted relative entropy kept (None = off), measured for SUGGESTION_SCORER; see prune_n_gram_counts
+PRUNE_COUNT_THRESHOLDS = {}
+PRUNE_ENTROPY_THRESHOLD = None
+# Held-out text the pruning report measures perplexity and top-k agreement on (None = sizes only)
+PRUNE_HELDOUT_PATH = None
+PRUNE_REPORT_CONTEXTS = 200
+# Whitespace chunks containing punctuation whose tokenization is memoized by the fast tokenizer
+TOKENIZER_CACHE_SIZE = 200000
+
+# Bumped whenever the layout of the saved model data changes.
+MODEL_FORMAT_VERSION = 2
+
+# --- 0. Model Object ---
+
+class NGramModel:
+    """
+    Vocabulary and N-gram counts (n_gram_counts_list[i] holds the (i+1)-grams), together with
+    the metadata the scoring functions would otherwise re-derive from the counts on every call.
+    """
+    def __init__(self, vocabulary, n_gram_counts_list, tables=None, version=None, totals=None):
+        self.vocabulary = vocabulary
+        self.n_gram_counts_list = n_gram_counts_list
+        self.tables = tables
+        # Highest N-gram order held by the model
+        self.order = len(n_gram_counts_list)
+        # Vocabulary size must include special tokens (</s> and <UNK>)
+        self.vocabulary_size = len(vocabulary) + 2
+        # Total number of N-grams counted, per order
+        self.totals = totals if totals is not None else [count_total(counts) for counts in n_gram_counts_list]
+        # Identifies this build of the model, e.g. for invalidating cached results
+        self.version = version if version is not None else time.strftime("%Y%m%d%H%M%S")
+
+    def to_dict(self):
+        """Returns the plain-dict form written by save_model."""
+        return {
+            'format_version': MODEL_FORMAT_VERSION,
+            'version': self.version,
+            'order': self.order,
+            'vocabulary_size': self.vocabulary_size,
+            'totals': self.totals,
+            'vocabulary': self.vocabulary,
+            'n_gram_counts_list': self.n_gram_counts_list,
+            'tables': self.tables
+        }
+
+    def suggest(self, previous_tokens, k=1.0, start_with=None, n_suggestions=5, scorer=None):
+        """
+        Returns the top (word, score) suggestions following previous_tokens. scorer (default
+        SUGGESTION_SCORER) picks get_suggestions ("laplace", scores are probabilities) or
+        suggest_backoff ("backoff", needs the tables); k only applies to "laplace".
+        """
+        if (scorer or SUGGESTION_SCORER) == "backoff":
+            if self.tables is None:
+                raise ValueError("Backoff scoring needs the suggestion tables (see build_suggestion_tables).")
+            return suggest_backoff(previous_tokens, self.n_gram_counts_list, self.tables, self.totals[0],
+                                   start_with=start_with, n_suggestions=n_suggestions)
+        return get_suggestions(previous_tokens, self.n_gram_counts_list, self.vocabulary, k=k,
+                               start_with=start_with, n_suggestions=n_suggestions, tables=self.tables)
+
+    def perplexity(self, sentence, n, k=1.0):
+        """Calculates the perplexity of a tokenized sentence under the N-gram model of order n (2 <= n <= order)."""
+        return calculate_perplexity(sentence, self.n_gram_counts_list[n-2], self.n_gram_counts_list[n-1],
+                                    self.vocabulary_size, k=k, n=n)
 
 # --- 1. Data Preprocessing Functions ---
 
-def save_model(vocabulary, n_gram_counts_list, filename=MODEL_FILE):
-    """Saves vocabulary set and N-gram counts to a pickle file."""
-    data = {
-        'vocabulary': vocabulary,
-        'n_gram_counts_list': n_gram_counts_list
-    }
+def save_model(model, filename=MODEL_FILE):
+    """Saves an NGramModel (vocabulary, N-gram counts, suggestion tables and metadata) to a pickle file."""
     with open(filename, 'wb') as f:
-        pickle.dump(data, f)
+        pickle.dump(model.to_dict(), f)
     print(f"\nAutocomplete model data successfully saved to {filename}")
 
-def load_model(filename=MODEL_FILE):
-    """Loads vocabulary set and N-gram counts from a pickle file."""
+def load_model(filename=MODEL_FILE, with_tables=True, packed=False):
+    """
+    Loads an NGramModel from a pickle file. Files written before the model metadata existed
+    are upgraded on load; with_tables=True also builds their suggestion tables.
+    With packed=True the counts are converted to PackedNGramCounts (see pack_n_gram_counts_list),
+    trading a little lookup speed for several times less memory.
+    """
     try:
         with open(filename, 'rb') as f:
             data = pickle.load(f)
+        if packed:
+            data['n_gram_counts_list'] = pack_n_gram_counts_list(data['n_gram_counts_list'], data['vocabulary'])
+            if data.get('tables') is not None:
+                # The dict-based continuation tables are replaced by views on the packed counts
+                counts = data['n_gram_counts_list']
+                data['tables']['continuations'] = [build_continuation_table(counts[i], counts[i+1], data['vocabulary'])
+                                                   for i in range(len(counts) - 1)]
+        tables = data.get('tables')
+        if tables is None and with_tables:
+            print("Model file has no suggestion tables, building them now.")
+            tables = build_suggestion_tables(data['vocabulary'], data['n_gram_counts_list'])
+        elif tables is not None and 'prefix_index' not in tables:
+            tables['prefix_index'] = build_prefix_index(tables['unigram_ranking'])
+        if tables is not None and 'backoff_weights' not in tables:
+            tables['backoff_weights'] = build_backoff_weights(len(data['n_gram_counts_list']))
+        # Older files carry no version: derive a stable one from the file itself
+        version = data.get('version', f"{int(os.path.getmtime(filename))}-{os.path.getsize(filename)}")
+        model = NGramModel(data['vocabulary'], data['n_gram_counts_list'], tables=tables,
+                           version=version, totals=data.get('totals'))
         print(f"\nAutocomplete model data successfully loaded from {filename}")
-        return data['vocabulary'], data['n_gram_counts_list']
+        return model
     except FileNotFoundError:
         print(f"Error: Model file {filename} not found. Must train the model first.")
-        return None, None
+        return None
     except KeyError as e:
         # Fixed: The KeyError was due to an old model format. Ensure the model is re-trained.
         print(f"Error loading model: Key {e} not found in the model file. Please ensure the model was trained with the current format (TRAINING_MODE=True).")
-        return None, None
+        return None
 
 def split_to_sentences(data):
     """Splits text data into a list of sentences."""
@@ -59,13 +171,57 @@ def split_to_sentences(data):
     sentences = [s for s in sentences if len(s) > 0]
     return sentences
 
-def tokenize_sentences(sentences):
+# Fast tokenizer: word_tokenize splits sentences with punkt and runs ~30 regex passes over each of them.
+# The sentences still come from punkt (sent_tokenize, so the punkt data is needed as for word_tokenize),
+# but alphanumeric chunks between whitespace never change under the treebank rules (except the few words
+# split by the contraction rules), so only chunks containing punctuation go through them, once each.
+TREEBANK_TOKENIZER = NLTKWordTokenizer()
+SPLIT_ALNUM_WORDS = {'cannot', 'gimme', 'gonna', 'gotta', 'lemme', 'wanna'}
+CLOSING_RE = re.compile(r'(?!"|\'\')[\]\)}>"\'»”’]+')
+# Where punkt can end a sentence: a period, ? or ! followed by another token or by the punctuation of
+# its period context pattern. Text without such a place is one sentence
+SENTENCE_BREAK_RE = re.compile(r'[.?!](?:[?!)";}\]*:@\'({\[]|\s+\S)')
+
+@lru_cache(maxsize=TOKENIZER_CACHE_SIZE)
+def tokenize_chunk(chunk, sentence_start, sentence_final):
+    """Treebank tokens of one whitespace chunk at the given position in its sentence."""
+    # Dummy words around the chunk keep the start-of-text quote rule and the end-of-sentence
+    # period rule from firing in the middle of a sentence
+    tokens = TREEBANK_TOKENIZER.tokenize(("" if sentence_start else "a ") + chunk + ("" if sentence_final else " a"))
+    return tuple(tokens[(0 if sentence_start else 1):(None if sentence_final else -1)])
+
+def fast_sentence_tokenize(sentence):
+    """NLTKWordTokenizer tokens of one punkt sentence, computed chunk by chunk."""
+    chunks = sentence.split()
+    last = len(chunks) - 1
+    # The final period rule also reaches over closing brackets and quotes standing alone at the end
+    # (except those the starting quote rule turns into ``)
+    while last > 0 and CLOSING_RE.fullmatch(chunks[last]):
+        last -= 1
+    tokens = []
+    for i, chunk in enumerate(chunks):
+        if chunk.isalnum() and chunk.lower() not in SPLIT_ALNUM_WORDS:
+            tokens.append(chunk)
+        else:
+            tokens.extend(tokenize_chunk(chunk, i == 0, i >= last))
+    return tokens
+
+def fast_word_tokenize(text):
+    """Drop-in for nltk's word_tokenize on lowercased text, returning the same tokens."""
+    sentences = sent_tokenize(text) if SENTENCE_BREAK_RE.search(text) else [text]
+    tokens = []
+    for sentence in sentences:
+        tokens.extend(fast_sentence_tokenize(sentence))
+    return tokens
+
+def tokenize_sentences(sentences, mode=None):
     """Tokenizes a list of sentence strings into a list of token lists."""
+    # mode overrides TOKENIZER_MODE; both tokenizers give the same result
+    tokenize = fast_word_tokenize if (mode or TOKENIZER_MODE) == "fast" else word_tokenize
     tokenized_list = []
     for sentence in sentences:
         sentence = sentence.lower()
-        # Use word_tokenize from nltk
-        tokenized = word_tokenize(sentence)
+        tokenized = tokenize(sentence)
         # --- FIX: Filter out tokens that are purely punctuation or digits ---
         cleaned_tokens = [token for token in tokenized if token.isalpha() or token.isalnum() or "'" in token or "-" in token]
         # Fallback to keep tokens if alpha/alnum filter is too strict, but try to exclude common punctuation
@@ -170,64 +326,376 @@ def estimate_probabilities(previous_n_gram, n_gram_counts, n_plus1_gram_counts,
         probabilities[word] = probability
     return probabilities
 
-def calculate_perplexity(sentence, n_gram_counts, n_plus1_gram_counts, vocabulary_size, start_token='<s>', end_token = '</s>', k=1.0):
-    """Calculates the perplexity of a given sentence using the N-gram model."""
+def sentence_log_loss(sentence, n_gram_counts, n_plus1_gram_counts, vocabulary_size, n, start_token='<s>', end_token='</s>', k=1.0):
+    """
+    Returns (-sum of the natural log probabilities, number of predictions) of a tokenized sentence
+    under the order-n model, padded with n-1 start tokens and an end token. Summing logs never
+    under- or overflows, so the totals of any number of sentences can be added up.
+    """
+    sentence = tuple([start_token] * (n-1) + sentence + [end_token])
+    log_loss = 0.0
+    # Start loop from the first word that requires a context (index n-1 in the padded sentence)
+    for t in range(n - 1, len(sentence)):
+        probability = estimate_probability(sentence[t], sentence[t-(n-1):t], n_gram_counts, n_plus1_gram_counts, vocabulary_size, k)
+        # Avoid log(0)
+        if probability == 0:
+            return float('inf'), len(sentence) - (n - 1)
+        log_loss -= math.log(probability)
+    return log_loss, len(sentence) - (n - 1)
+
+def calculate_perplexity(sentence, n_gram_counts, n_plus1_gram_counts, vocabulary_size, start_token='<s>', end_token = '</s>', k=1.0, n=None):
+    """
+    Calculates the perplexity of a given sentence using the N-gram model.
+    n is the order of n_plus1_gram_counts (NGramModel.perplexity passes it); it is only
+    read off the first key when not given.
+    """
     
     # The length of the context is determined by the size of the N-grams in the counts dictionary
-    try:
-        # Determine N from the keys of the N-gram (N+1 in the count variable name)
-        n = len(list(n_plus1_gram_counts.keys())[0])
-    except IndexError:
-        # Handle case where n_plus1_gram_counts is empty
-        return float('inf') 
-
-    # Pad sentence
-    # Padding is (N-1) tokens long
-    sentence = [start_token] * (n-1) + sentence + [end_token]
-    sentence = tuple(sentence)
-    
+    if n is None:
+        try:
+            # Determine N from the keys of the N-gram (N+1 in the count variable name)
+            n = len(next(iter(n_plus1_gram_counts)))
+        except StopIteration:
+            # Handle case where n_plus1_gram_counts is empty
+            return float('inf') 
+
     # N is the number of predictions made (original sentence length + 1 for end token)
-    N = len(sentence) - (n - 1) 
-    
-    product_pi = 1.0
+    log_loss, N = sentence_log_loss(sentence, n_gram_counts, n_plus1_gram_counts, vocabulary_size, n,
+                                    start_token=start_token, end_token=end_token, k=k)
     
-    # Start loop from the first word that requires a context (index n-1 in the padded sentence)
-    for t in range(n - 1, len(sentence)): 
-        # The previous context is (n-1) tokens long
-        previous_n_gram = sentence[t-(n-1):t]
-        word = sentence[t]
+    # Perplexity formula: PPL = (1/P)^(1/N), computed in log space
+    return math.exp(log_loss / N)
 
-        # Use the N-gram counts for the context (previous_n_gram is N-1 tokens)
-        probability = estimate_probability(word, previous_n_gram, n_gram_counts, n_plus1_gram_counts, vocabulary_size, k)
-        
-        # Avoid log(0)
-        if probability == 0:
-            return float('inf')
-            
-        product_pi *= (1 / probability)
+# --- 3. Packed N-gram Storage ---
+
+class PackedNGramCounts:
+    """
+    Read-only, dict-like N-gram counts kept in NumPy arrays instead of a dict of string tuples.
+    Words are integer IDs (their index in the shared lexicon). Entries are sorted by context
+    (the first n-1 IDs packed into one uint64, in mixed radix of the lexicon size) and then by
+    the last word, so a lookup is a binary search and a context's continuations are one slice.
+    """
+    def __init__(self, n, lexicon, word_ids, contexts, words, counts, by_count):
+        self.n = n
+        self.lexicon = lexicon
+        self.word_ids = word_ids
+        self.contexts = contexts
+        self.words = words
+        self.counts = counts
+        # Entry positions with each context's continuations ordered by count (descending), then ID
+        self.by_count = by_count
+
+    @classmethod
+    def from_counts(cls, n_gram_counts, n, lexicon, word_ids):
+        """Packs a {n_gram_tuple: count} dict of N-grams of length n."""
+        radix = len(lexicon)
+        if radix ** max(n - 1, 1) >= 2 ** 64:
+            raise ValueError(f"A lexicon of {radix} words is too large to pack {n}-gram contexts into 64 bits")
+        size = len(n_gram_counts)
+        ids = np.fromiter((word_ids[w] for n_gram in n_gram_counts for w in n_gram),
+                          dtype=np.uint64, count=size * n).reshape(size, n)
+        counts = np.fromiter(n_gram_counts.values(), dtype=np.uint32, count=size)
+        contexts = np.zeros(size, dtype=np.uint64)
+        for j in range(n - 1):
+            contexts = contexts * np.uint64(radix) + ids[:, j]
+        words = ids[:, n-1].astype(np.uint32)
         
-    # Perplexity formula: PPL = (1/P)^(1/N)
-    perplexity = (product_pi)**(1/N)
+        order = np.lexsort((words, contexts))
+        contexts, words, counts = contexts[order], words[order], counts[order]
+        by_count = np.lexsort((words, -counts.astype(np.int64), contexts)).astype(np.uint32)
+        return cls(n, lexicon, word_ids, contexts, words, counts, by_count)
+
+    def context_range(self, context):
+        """Returns the (lo, hi) slice of entries whose first n-1 words are 'context' (lo == hi if none)."""
+        key = 0
+        for w in context:
+            i = self.word_ids.get(w)
+            if i is None:
+                return 0, 0
+            key = key * len(self.lexicon) + i
+        key = np.uint64(key)
+        return int(self.contexts.searchsorted(key, 'left')), int(self.contexts.searchsorted(key, 'right'))
+
+    def continuations(self, lo, hi):
+        """The (word, count) entries of one context slice, most frequent first, as a sized iterable."""
+        return ContinuationSlice(self, lo, hi)
+
+    def get(self, n_gram, default=0):
+        if len(n_gram) != self.n:
+            return default
+        lo, hi = self.context_range(n_gram[:-1])
+        i = self.word_ids.get(n_gram[-1])
+        if lo == hi or i is None:
+            return default
+        pos = lo + int(self.words[lo:hi].searchsorted(np.uint32(i)))
+        if pos < hi and self.words[pos] == i:
+            return int(self.counts[pos])
+        return default
+
+    def __getitem__(self, n_gram):
+        count = self.get(n_gram, None)
+        if count is None:
+            raise KeyError(n_gram)
+        return count
+
+    def __contains__(self, n_gram):
+        return self.get(n_gram, None) is not None
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __iter__(self):
+        return (n_gram for n_gram, _ in self.items())
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return (int(c) for c in self.counts)
+
+    def items(self):
+        radix = len(self.lexicon)
+        for context, word, count in zip(self.contexts.tolist(), self.words.tolist(), self.counts.tolist()):
+            ids = [word]
+            for _ in range(self.n - 1):
+                context, i = divmod(context, radix)
+                ids.append(i)
+            yield tuple(self.lexicon[i] for i in reversed(ids)), count
+
+    def total(self):
+        """Sum of all counts."""
+        return int(self.counts.sum(dtype=np.uint64))
+
+class ContinuationSlice:
+    """Lazy (word, count) entries of one context slice of PackedNGramCounts (see continuations)."""
+    def __init__(self, counts, lo, hi):
+        self.counts = counts
+        self.lo = lo
+        self.hi = hi
+
+    def __len__(self):
+        return self.hi - self.lo
+
+    def __iter__(self):
+        counts = self.counts
+        lexicon = counts.lexicon
+        for i in counts.by_count[self.lo:self.hi]:
+            yield lexicon[counts.words[i]], int(counts.counts[i])
+
+    def total(self):
+        """Sum of the counts of the slice."""
+        return int(self.counts.counts[self.lo:self.hi].sum())
+
+class PackedContinuationTable:
+    """The continuation table interface (see build_continuation_table) served from PackedNGramCounts slices."""
+    def __init__(self, n_gram_counts, n_plus1_gram_counts):
+        self.n_gram_counts = n_gram_counts
+        self.n_plus1_gram_counts = n_plus1_gram_counts
+
+    def get(self, context, default=None):
+        lo, hi = self.n_plus1_gram_counts.context_range(context)
+        if lo == hi:
+            return default
+        return self.n_gram_counts.get(context, 0), self.n_plus1_gram_counts.continuations(lo, hi)
+
+def build_lexicon(vocabulary, unigram_counts, special_tokens=('<s>', '</s>', '<UNK>')):
+    """
+    Assigns integer IDs: vocabulary words first (so ID order is vocabulary order), then the
+    special tokens and any other word seen in the unigram counts. Returns (lexicon, word_ids).
+    """
+    lexicon = list(vocabulary)
+    word_ids = {w: i for i, w in enumerate(lexicon)}
+    extra = list(special_tokens) + [n_gram[0] for n_gram in unigram_counts]
+    for w in extra:
+        if w not in word_ids:
+            word_ids[w] = len(lexicon)
+            lexicon.append(w)
+    return lexicon, word_ids
+
+def pack_n_gram_counts_list(n_gram_counts_list, vocabulary):
+    """Converts every dict in n_gram_counts_list into a PackedNGramCounts sharing one lexicon."""
+    lexicon, word_ids = build_lexicon(vocabulary, n_gram_counts_list[0])
+    return [PackedNGramCounts.from_counts(counts, n, lexicon, word_ids)
+            for n, counts in enumerate(n_gram_counts_list, start=1)]
+
+def count_total(n_gram_counts):
+    """Sum of the counts of a dict or PackedNGramCounts."""
+    if isinstance(n_gram_counts, PackedNGramCounts):
+        return n_gram_counts.total()
+    return sum(n_gram_counts.values())
+
+# --- 4. Precomputed Suggestion Tables ---
+
+def build_continuation_table(n_gram_counts, n_plus1_gram_counts, vocabulary):
+    """
+    Groups the (N+1)-grams by their N-gram context:
+    {context: (context_count, [(word, count), ...])}, continuations sorted by count
+    (descending) with ties in vocabulary order, as estimate_probabilities would rank them.
+    Packed counts are already stored that way and get a PackedContinuationTable instead.
+    """
+    if isinstance(n_plus1_gram_counts, PackedNGramCounts):
+        return PackedContinuationTable(n_gram_counts, n_plus1_gram_counts)
+    order = {word: i for i, word in enumerate(vocabulary)}
+    last = len(order)
+    table = {}
+    for n_plus1_gram, count in n_plus1_gram_counts.items():
+        table.setdefault(n_plus1_gram[:-1], []).append((n_plus1_gram[-1], count))
+    for context, continuations in table.items():
+        continuations.sort(key=lambda x: (-x[1], order.get(x[0], last)))
+        table[context] = (n_gram_counts.get(context, 0), continuations)
+    return table
+
+def build_unigram_ranking(unigram_counts, vocabulary):
+    """Returns the vocabulary sorted by unigram count (descending), used to fill in unseen continuations."""
+    return sorted(vocabulary, key=lambda word: -unigram_counts.get((word,), 0))
+
+def build_prefix_index(unigram_ranking, cache_depth=PREFIX_CACHE_DEPTH, cache_size=PREFIX_CACHE_SIZE):
+    """
+    Builds a prefix index over the vocabulary: the words in sorted order with their position
+    in unigram_ranking alongside, so the words under a prefix are one bisect range, plus the
+    top cache_size words of every prefix up to cache_depth letters (the widest ranges).
+    """
+    rank = {word: i for i, word in enumerate(unigram_ranking)}
+    words = sorted(unigram_ranking)
+    top = {}
+    for word in unigram_ranking:
+        for length in range(1, min(cache_depth, len(word)) + 1):
+            cached = top.setdefault(word[:length], [])
+            if len(cached) < cache_size:
+                cached.append(word)
+    return {
+        'words': words,
+        'ranks': [rank[word] for word in words],
+        'top': top,
+        'cache_size': cache_size
+    }
+
+def prefix_range(prefix, prefix_index):
+    """The (lo, hi) range of prefix_index['words'] starting with prefix."""
+    words = prefix_index['words']
+    lo = bisect.bisect_left(words, prefix)
+    return lo, bisect.bisect_left(words, prefix + chr(0x10FFFF), lo)
+
+def prefix_words_by_rank(prefix, prefix_index, max_words=PREFIX_LOOKUPS):
+    """
+    Every vocabulary word starting with prefix, most frequent first, or None when there are
+    more than max_words of them.
+    """
+    lo, hi = prefix_range(prefix, prefix_index)
+    if hi - lo > max_words:
+        return None
+    words = prefix_index['words']
+    return [words[i] for i in sorted(range(lo, hi), key=prefix_index['ranks'].__getitem__)]
 
-    return perplexity
+def words_with_prefix(prefix, prefix_index, n_words):
+    """Returns up to n_words vocabulary words starting with prefix, most frequent first."""
+    cached = prefix_index['top'].get(prefix)
+    # A cached list shorter than the cache size already holds every word under the prefix
+    if cached is not None and (n_words <= len(cached) or len(cached) < prefix_index['cache_size']):
+        return cached[:n_words]
+    words = prefix_index['words']
+    lo, hi = prefix_range(prefix, prefix_index)
+    ranks = prefix_index['ranks']
+    best = heapq.nsmallest(n_words, range(lo, hi), key=ranks.__getitem__)
+    return [words[i] for i in best]
 
-# --- 3. Autocomplete Functions ---
+def build_suggestion_tables(vocabulary, n_gram_counts_list):
+    """
+    Builds the lookup tables used by suggest_a_word/get_suggestions:
+    'continuations'[i] pairs n_gram_counts_list[i] with n_gram_counts_list[i+1],
+    'prefix_index' serves completions of a partially typed word (start_with),
+    'backoff_weights' holds the per-order penalties of suggest_backoff.
+    """
+    continuations = [build_continuation_table(n_gram_counts_list[i], n_gram_counts_list[i+1], vocabulary)
+                     for i in range(len(n_gram_counts_list) - 1)]
+    unigram_ranking = build_unigram_ranking(n_gram_counts_list[0], vocabulary)
+    return {
+        'continuations': continuations,
+        'unigram_ranking': unigram_ranking,
+        'prefix_index': build_prefix_index(unigram_ranking),
+        'backoff_weights': build_backoff_weights(len(n_gram_counts_list))
+    }
+
+def build_backoff_weights(order, alpha=BACKOFF_ALPHA):
+    """weights[d] multiplies the relative frequencies found after backing off d orders."""
+    return [alpha ** d for d in range(order)]
+
+# --- 5. Autocomplete Functions ---
 
-def suggest_a_word(previous_tokens, n_gram_counts, n_plus1_gram_counts, vocabulary, end_token='</s>', unknown_token="<UNK>", k=1.0, start_with=None, n_suggestions=5):
+def suggest_from_table(previous_n_gram, n_gram_counts, continuation_table, unigram_ranking, vocabulary_size, end_token='</s>', unknown_token="<UNK>", k=1.0, start_with=None, n_suggestions=5, prefix_index=None, n_plus1_gram_counts=None):
+    """
+    Same top N as estimate_probabilities + sort, but only visits the observed continuations
+    of the context, then pads with the most frequent unseen words (all at the smoothed floor).
+    With a prefix_index, the padding for start_with only visits words under that prefix, and
+    when fewer words than continuations are under it (at most PREFIX_LOOKUPS), their counts are
+    looked up in n_plus1_gram_counts instead of scanning the continuations (equal counts are
+    then ordered by frequency rather than vocabulary order, as in suggest_backoff).
+    """
+    previous_n_gram = tuple(previous_n_gram)
+    context_count, continuations = continuation_table.get(previous_n_gram, (n_gram_counts.get(previous_n_gram, 0), []))
+    denominator = context_count + k * vocabulary_size
+    
+    if start_with and prefix_index is not None and n_plus1_gram_counts is not None and continuations:
+        prefix_words = prefix_words_by_rank(start_with, prefix_index, min(PREFIX_LOOKUPS, len(continuations) - 1))
+        if prefix_words is not None:
+            counted = [(word, n_plus1_gram_counts.get(previous_n_gram + (word,), 0)) for word in prefix_words]
+            continuations = sorted((wc for wc in counted if wc[1]), key=lambda x: -x[1])
+    
+    suggestions = []
+    seen = set()
+    for word, count in continuations:
+        if word in ('<s>', end_token, unknown_token):
+            continue
+        if start_with and not word.startswith(start_with):
+            continue
+        suggestions.append((word, (count + k) / denominator))
+        seen.add(word)
+        if len(suggestions) >= n_suggestions:
+            return suggestions
+    
+    if start_with and prefix_index is not None:
+        # Enough words to fill up even if all the seen ones come back
+        unigram_ranking = words_with_prefix(start_with, prefix_index, n_suggestions + len(seen))
+    for word in unigram_ranking:
+        if word in seen or word in ('<s>', end_token, unknown_token):
+            continue
+        if start_with and not word.startswith(start_with):
+            continue
+        suggestions.append((word, k / denominator))
+        if len(suggestions) >= n_suggestions:
+            break
+    return suggestions
+
+def suggest_a_word(previous_tokens, n_gram_counts, n_plus1_gram_counts, vocabulary, end_token='</s>', unknown_token="<UNK>", k=1.0, start_with=None, n_suggestions=5, continuation_table=None, unigram_ranking=None, n=None, prefix_index=None):
     """
     Returns a list of top N suggestions (word, prob) tuples, correctly sorted and filtered.
+    If a continuation_table (see build_continuation_table) is given, only the observed
+    continuations of the context are scored instead of the whole vocabulary.
+    n is the order of n_plus1_gram_counts; it is only read off the first key when not given.
     """
     
     # Determine the context size (n-1) based on the N-gram counts provided
-    try:
-        n = len(list(n_plus1_gram_counts.keys())[0])
-    except IndexError:
+    if n is None:
+        try:
+            n = len(next(iter(n_plus1_gram_counts)))
+        except StopIteration:
+            return []
+    if not n_plus1_gram_counts:
         return []
 
     # Pad previous_tokens to ensure correct context length
     previous_tokens = ['<s>'] * (n - 1) + previous_tokens
     previous_n_gram = previous_tokens[-(n-1):] # Take the context of size n-1
     
+    if continuation_table is not None:
+        if unigram_ranking is None:
+            unigram_ranking = vocabulary
+        # Vocabulary size includes the special tokens (</s> and <UNK>)
+        return suggest_from_table(previous_n_gram, n_gram_counts, continuation_table, unigram_ranking,
+                                  len(vocabulary) + 2, end_token=end_token, unknown_token=unknown_token,
+                                  k=k, start_with=start_with, n_suggestions=n_suggestions,
+                                  prefix_index=prefix_index, n_plus1_gram_counts=n_plus1_gram_counts)
+    
     probabilities = estimate_probabilities(previous_n_gram,
                                              n_gram_counts, n_plus1_gram_counts,
                                              vocabulary, end_token=end_token, unknown_token=unknown_token, k=k)
@@ -252,15 +720,18 @@ def suggest_a_word(previous_tokens, n_gram_counts, n_plus1_gram_counts, vocabula
     # Return the top N suggestions
     return suggestions[:n_suggestions]
 
-def get_suggestions(previous_tokens, n_gram_counts_list, vocabulary, k=1.0, start_with=None, n_suggestions=5):
+def get_suggestions(previous_tokens, n_gram_counts_list, vocabulary, k=1.0, start_with=None, n_suggestions=5, tables=None):
     """
     Aggregates unique words from multiple N-gram models, keeps the MAX probability, 
     and returns a list of (word, probability) tuples sorted correctly.
+    With tables (see build_suggestion_tables) each model is queried through its continuation table.
     """
     
     # Dictionary to track the MAXIMUM probability for each unique word
     all_suggestions = {} 
     model_counts = len(n_gram_counts_list)
+    # Time spent scoring each order, then merging
+    timer = StageTimer('suggest')
     
     # Iterate over N-gram models. The list is structured as [1-gram, 2-gram, 3-gram, 4-gram]
     # Starting from the highest N-gram (N=4) down to the 2-gram (N=2) model (i=1)
@@ -272,13 +743,20 @@ def get_suggestions(previous_tokens, n_gram_counts_list, vocabulary, k=1.0, star
         # Get suggestions from this model 
         model_suggestions = suggest_a_word(
             previous_tokens, n_gram_counts, n_plus1_gram_counts, 
-            vocabulary, k=k, start_with=start_with, n_suggestions=n_suggestions * 2
+            vocabulary, k=k, start_with=start_with, n_suggestions=n_suggestions * 2,
+            continuation_table=tables['continuations'][i] if tables else None,
+            unigram_ranking=tables['unigram_ranking'] if tables else None,
+            n=i + 2,
+            prefix_index=tables.get('prefix_index') if tables else None
         )
         
+        timer.lap(f'order{i + 2}')
+        
         # Aggregate results: Keep the suggestion with the highest probability
         for word, prob in model_suggestions:
             if word not in all_suggestions or prob > all_suggestions[word]:
                 all_suggestions[word] = prob
+        timer.lap('merge')
 
     # 1. Convert the unique words/probabilities from the dictionary back to a list of tuples
     final_suggestions = [(word, prob) for word, prob in all_suggestions.items()]
@@ -286,11 +764,325 @@ def get_suggestions(previous_tokens, n_gram_counts_list, vocabulary, k=1.0, star
     # 2. Sort the combined list by probability (descending)
     final_suggestions.sort(key=lambda x: x[1], reverse=True)
     
+    timer.lap('merge')
+    timer.record()
+    
     # 3. Return the top N overall suggestions
     return final_suggestions[:n_suggestions]
 
+def suggest_backoff(previous_tokens, n_gram_counts_list, tables, unigram_total, end_token='</s>', unknown_token="<UNK>", start_with=None, n_suggestions=5):
+    """
+    Stupid backoff (Brants et al., 2007): scores the continuations of the longest context by
+    count(context + word) / count(context), and backs off to the next shorter context (scaled by
+    tables['backoff_weights']) only while fewer than n_suggestions words were found, down to the
+    unigram frequencies. Scores are not probabilities. Returns (word, score) tuples, best first.
+    """
+    order = len(n_gram_counts_list)
+    weights = tables['backoff_weights']
+    skip = ('<s>', end_token, unknown_token)
+    previous_tokens = ['<s>'] * (order - 1) + previous_tokens
+    scores = {}
+
+    # Few enough words under start_with: counting each of them beats scanning every continuation
+    prefix_words = None
+    prefix_index = tables.get('prefix_index')
+    if start_with and prefix_index is not None:
+        prefix_words = prefix_words_by_rank(start_with, prefix_index)
+
+    # Orders n down to 2 score the continuations of the last n-1 tokens
+    for n in range(order, 1, -1):
+        context = tuple(previous_tokens[-(n-1):])
+        context_count, continuations = tables['continuations'][n-2].get(context, (0, []))
+        if not context_count and continuations:
+            # Contexts padded with more start tokens than the lower order has (the sentence start)
+            # were never counted on their own: their continuations add up to their count
+            context_count = continuations.total() if isinstance(continuations, ContinuationSlice) else sum(c for _, c in continuations)
+        if not context_count:
+            continue
+        if prefix_words is not None:
+            counted = [(word, n_gram_counts_list[n-1].get(context + (word,), 0)) for word in prefix_words]
+            continuations = sorted((wc for wc in counted if wc[1]), key=lambda x: -x[1])
+        weight = weights[order - n]
+        found = 0
+        # Continuations come most frequent first: the first n_suggestions new ones are the best of this order
+        for word, count in continuations:
+            if word in skip or word in scores or (start_with and not word.startswith(start_with)):
+                continue
+            scores[word] = weight * count / context_count
+            found += 1
+            if found >= n_suggestions:
+                break
+        if len(scores) >= n_suggestions:
+            break
+    else:
+        weight = weights[order - 1]
+        if start_with and prefix_index is not None:
+            ranking = words_with_prefix(start_with, prefix_index, n_suggestions + len(scores) + len(skip))
+        else:
+            ranking = tables['unigram_ranking']
+        unigram_counts = n_gram_counts_list[0]
+        for word in ranking:
+            if len(scores) >= n_suggestions:
+                break
+            if word in skip or word in scores or (start_with and not word.startswith(start_with)):
+                continue
+            scores[word] = weight * unigram_counts.get((word,), 0) / unigram_total
+
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:n_suggestions]
+
+
+# --- 6. Parallel Training ---
+
+def count_all_n_grams(data, max_n, start_token='<s>', end_token='</s>'):
+    """Counts the N-grams of every order 1..max_n in one pass; same dicts as count_n_grams per order."""
+    n_gram_counts_list = [{} for _ in range(max_n)]
+    for sentence in data:
+        for n in range(1, max_n + 1):
+            n_gram_counts = n_gram_counts_list[n-1]
+            padded = [start_token] * (n - 1) + sentence + [end_token]
+            for i in range(len(padded) - n + 1):
+                n_gram = tuple(padded[i:i+n])
+                n_gram_counts[n_gram] = n_gram_counts.get(n_gram, 0) + 1
+    return n_gram_counts_list
+
+def shard_file(file_path, n_shards):
+    """Splits a file into up to n_shards (start, end) byte ranges, each starting right after a newline."""
+    size = os.path.getsize(file_path)
+    bounds = [0]
+    with open(file_path, 'rb') as f:
+        for i in range(1, n_shards):
+            pos = size * i // n_shards
+            if pos <= bounds[-1]:
+                continue
+            # Move to the end of the line holding byte pos-1
+            f.seek(pos - 1)
+            f.readline()
+            pos = f.tell()
+            if bounds[-1] < pos < size:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def stream_sentences(file_path, start=0, end=None):
+    """
+    Yields the sentences of a file (or of its [start, end) byte range) one line at a time,
+    split and stripped like split_to_sentences, without reading the whole file.
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        pos = start
+        for line in f:
+            if end is not None and pos >= end:
+                break
+            pos += len(line)
+            # Same newline handling as reading the file in text mode
+            line = line.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+            for sentence in line.split('\n'):
+                sentence = sentence.strip()
+                if sentence:
+                    yield sentence
+
+def stream_tokenized_sentences(file_path, start=0, end=None):
+    """Yields the token list of every sentence from stream_sentences, tokenized like tokenize_sentences."""
+    for sentence in stream_sentences(file_path, start, end):
+        yield tokenize_sentences([sentence])[0]
+
+def count_shard(task):
+    """
+    Worker: streams one byte range of the corpus through the tokenizer and counts its raw
+    N-grams (before <UNK> replacement, which needs the global vocabulary) of every order.
+    """
+    file_path, start, end, max_n = task
+    return count_all_n_grams(stream_tokenized_sentences(file_path, start, end), max_n)
+
+def merge_n_gram_counts(merged_list, n_gram_counts_list):
+    """Adds one shard's counts into merged_list in place; merging shards in file order keeps first-seen key order."""
+    for merged, n_gram_counts in zip(merged_list, n_gram_counts_list):
+        for n_gram, count in n_gram_counts.items():
+            merged[n_gram] = merged.get(n_gram, 0) + count
+    return merged_list
+
+def replace_oov_in_n_gram_counts(n_gram_counts, vocabulary, unknown_token="<UNK>", start_token='<s>', end_token='</s>'):
+    """
+    Maps every out-of-vocabulary word in the N-gram keys to unknown_token and sums the counts
+    that collide, giving the counts of replace_oov_words_by_unk'd sentences in the same key order.
+    n_gram_counts is a dict or an iterable of (n_gram, count) pairs.
+    """
+    keep = set(vocabulary) | {start_token, end_token}
+    replaced = {}
+    items = n_gram_counts.items() if hasattr(n_gram_counts, 'items') else n_gram_counts
+    for n_gram, count in items:
+        n_gram = tuple(w if w in keep else unknown_token for w in n_gram)
+        replaced[n_gram] = replaced.get(n_gram, 0) + count
+    return replaced
+
+def build_n_gram_counts_parallel(file_path, count_threshold, max_n=4, processes=TRAIN_PROCESSES, end_token='</s>'):
+    """
+    Builds (vocabulary, n_gram_counts_list) for a corpus file with a pool of worker processes,
+    one pass per byte-range shard. The result is identical to tokenize_data + preprocess_data's
+    vocabulary + count_n_grams per order on the whole file.
+    """
+    raw_counts_list = count_raw_n_grams_parallel(file_path, max_n, processes)
+    return apply_count_threshold(raw_counts_list, count_threshold, end_token=end_token)
+
+def count_raw_n_grams_parallel(file_path, max_n=4, processes=TRAIN_PROCESSES):
+    """The N-gram counts of every order of a corpus file before <UNK> replacement, counted by a pool of workers."""
+    processes = processes or os.cpu_count()
+    tasks = [(file_path, start, end, max_n) for start, end in shard_file(file_path, processes * SHARDS_PER_PROCESS)]
+    
+    raw_counts_list = [{} for _ in range(max_n)]
+    if processes == 1:
+        for shard_counts in map(count_shard, tasks):
+            merge_n_gram_counts(raw_counts_list, shard_counts)
+    else:
+        with Pool(processes) as pool:
+            # imap hands results back in shard order, which the merge relies on
+            for shard_counts in pool.imap(count_shard, tasks):
+                merge_n_gram_counts(raw_counts_list, shard_counts)
+    return raw_counts_list
+
+def apply_count_threshold(raw_counts_list, count_threshold, end_token='</s>'):
+    """
+    Returns (vocabulary, n_gram_counts_list): the words counted at least count_threshold times,
+    and the raw counts with every other word replaced by <UNK>.
+    """
+    # Unigram counts are the word counts plus one end token per sentence
+    word_counts = {n_gram[0]: count for n_gram, count in raw_counts_list[0].items() if n_gram[0] != end_token}
+    vocabulary = [word for word, count in word_counts.items() if count >= count_threshold]
+    n_gram_counts_list = [replace_oov_in_n_gram_counts(n_gram_counts, vocabulary) for n_gram_counts in raw_counts_list]
+    return vocabulary, n_gram_counts_list
+
+# --- 7. Pruning ---
+#
+# Drops rarely useful higher-order N-grams before the model is saved. An N-gram goes when its count
+# is below the threshold of its order, or when its weighted relative entropy is below
+# PRUNE_ENTROPY_THRESHOLD: P(h, w) * |log(P(w | h) / P'(w | h))|, the share of the model's
+# probability mass it carries times how far its estimate is from the estimate that replaces it
+# once it is gone (Stolcke-style, without renormalizing). Both estimates come from the scorer the
+# model is served with: for "backoff" P' is the stupid-backoff estimate of the order below; for
+# "laplace" it is the add-k estimate of an unseen N-gram, or the add-k estimate of the order below
+# when get_suggestions, which keeps the best of orders 3 and up, would use that one instead.
+# Unigrams are never pruned, and an N-gram that is the context of a kept (N+1)-gram is always
+# kept, so every remaining probability keeps its context count.
+
+def backoff_log_ratio(n_gram, count, n_gram_counts_list, unigram_total, alpha=BACKOFF_ALPHA):
+    """|log(P(w | h) / P_bo(w | h))| for the N-gram h + (w,) with the given count (N >= 2)."""
+    n = len(n_gram)
+    # Contexts padded with more start tokens than the lower order has were never counted on their own
+    context_count = max(n_gram_counts_list[n-2].get(n_gram[:-1], 0), count)
+    if n == 2:
+        lower_count, lower_context_count = n_gram_counts_list[0].get(n_gram[1:], 0), unigram_total
+    else:
+        lower_count = n_gram_counts_list[n-2].get(n_gram[1:], 0)
+        lower_context_count = n_gram_counts_list[n-3].get(n_gram[1:-1], 0)
+    if not lower_count or not lower_context_count:
+        return float('inf')
+    return abs(math.log((count / context_count) / (alpha * lower_count / lower_context_count)))
+
+def laplace_log_ratio(n_gram, count, n_gram_counts_list, vocabulary_size, k=1.0):
+    """|log(P(w | h) / P'(w | h))| under add-k smoothing for the N-gram h + (w,) with the given count (N >= 2)."""
+    n = len(n_gram)
+    context_count = max(n_gram_counts_list[n-2].get(n_gram[:-1], 0), count)
+    denominator = context_count + k * vocabulary_size
+    pruned = k / denominator
+    if n > 3:
+        lower_context_count = n_gram_counts_list[n-3].get(n_gram[1:-1], 0)
+        pruned = max(pruned, (n_gram_counts_list[n-2].get(n_gram[1:], 0) + k) / (lower_context_count + k * vocabulary_size))
+    return abs(math.log((count + k) / denominator / pruned))
+
+def prune_n_gram_counts(n_gram_counts_list, count_thresholds=None, entropy_threshold=None, alpha=BACKOFF_ALPHA,
+                        scorer=None, k=1.0, vocabulary_size=None):
+    """
+    Returns a pruned copy of n_gram_counts_list. count_thresholds maps an order (>= 2) to the
+    smallest count kept; entropy_threshold (None = off) is the smallest weighted relative entropy kept,
+    measured for scorer (default SUGGESTION_SCORER): "backoff" (alpha) or "laplace" (k and the
+    model's vocabulary_size, by default the number of unigrams).
+    """
+    count_thresholds = count_thresholds or {}
+    order = len(n_gram_counts_list)
+    unigram_total = count_total(n_gram_counts_list[0])
+    if (scorer or SUGGESTION_SCORER) == "backoff":
+        log_ratio = lambda n_gram, count: backoff_log_ratio(n_gram, count, n_gram_counts_list, unigram_total, alpha)
+    else:
+        vocabulary_size = vocabulary_size or len(n_gram_counts_list[0])
+        log_ratio = lambda n_gram, count: laplace_log_ratio(n_gram, count, n_gram_counts_list, vocabulary_size, k)
+    pruned_list = [None] * order
+    pruned_list[0] = dict(n_gram_counts_list[0])
+    # Highest order first, so that contexts of kept N-grams are known when the order below is pruned
+    required = set()
+    for n in range(order, 1, -1):
+        n_gram_counts = n_gram_counts_list[n-1]
+        threshold = count_thresholds.get(n, 1)
+        total = count_total(n_gram_counts)
+        kept = {}
+        for n_gram, count in n_gram_counts.items():
+            if n_gram not in required:
+                if count < threshold:
+                    continue
+                if entropy_threshold is not None and count / total * log_ratio(n_gram, count) < entropy_threshold:
+                    continue
+            kept[n_gram] = count
+        pruned_list[n-1] = kept
+        required = {n_gram[:-1] for n_gram in kept}
+    return pruned_list
+
+def heldout_quality(model, sentences, orders, contexts, k=1.0, n_suggestions=5):
+    """Per-order perplexity of tokenized (<UNK>-replaced) sentences and the top suggestions for each context."""
+    perplexity = {}
+    for n in orders:
+        log_loss, predictions = 0.0, 0
+        for sentence in sentences:
+            sentence_loss, sentence_predictions = sentence_log_loss(
+                sentence, model.n_gram_counts_list[n-2], model.n_gram_counts_list[n-1], model.vocabulary_size, n, k=k)
+            log_loss += sentence_loss
+            predictions += sentence_predictions
+        perplexity[n] = math.exp(log_loss / predictions) if predictions else float('inf')
+    suggestions = [[word for word, _ in model.suggest(context, k=k, n_suggestions=n_suggestions)] for context in contexts]
+    return perplexity, suggestions
+
+def pruning_report(model, pruned_model, heldout_sentences=None, n_contexts=PRUNE_REPORT_CONTEXTS, n_suggestions=5, seed=0):
+    """
+    Compares a pruned model with the model it was pruned from: entries removed and pickled bytes
+    saved per order and, given tokenized held-out sentences, the per-order perplexity change and
+    top-k agreement (the mean share of the unpruned top n_suggestions the pruned model also returns).
+    """
+    report = {'orders': {}, 'entries_removed': 0, 'bytes_saved': 0}
+    for n, (counts, pruned) in enumerate(zip(model.n_gram_counts_list, pruned_model.n_gram_counts_list), start=1):
+        size = len(pickle.dumps(counts, protocol=pickle.HIGHEST_PROTOCOL))
+        pruned_size = len(pickle.dumps(pruned, protocol=pickle.HIGHEST_PROTOCOL))
+        report['orders'][n] = {'entries': len(counts), 'entries_kept': len(pruned), 'entries_removed': len(counts) - len(pruned),
+                               'bytes': size, 'bytes_saved': size - pruned_size}
+        report['entries_removed'] += len(counts) - len(pruned)
+        report['bytes_saved'] += size - pruned_size
+
+    if heldout_sentences:
+        sentences = replace_oov_words_by_unk(heldout_sentences, model.vocabulary)
+        orders = range(2, model.order + 1)
+        # Contexts: the words before a random position of random held-out sentences
+        rng = random.Random(seed)
+        contexts = []
+        for sentence in rng.choices(sentences, k=n_contexts):
+            contexts.append(sentence[:rng.randint(0, len(sentence))])
+        perplexity, suggestions = heldout_quality(model, sentences, orders, contexts, n_suggestions=n_suggestions)
+        pruned_perplexity, pruned_suggestions = heldout_quality(pruned_model, sentences, orders, contexts, n_suggestions=n_suggestions)
+        report['perplexity'] = {n: {'unpruned': perplexity[n], 'pruned': pruned_perplexity[n],
+                                    'change': pruned_perplexity[n] / perplexity[n] - 1} for n in orders}
+        agreements = [len(set(words) & set(pruned_words)) / len(words)
+                      for words, pruned_words in zip(suggestions, pruned_suggestions) if words]
+        report['top_k_agreement'] = sum(agreements) / len(agreements) if agreements else 1.0
+    return report
+
+def print_pruning_report(report):
+    for n, stats in report['orders'].items():
+        print(f"{n}-grams: {stats['entries_kept']}/{stats['entries']} kept, "
+              f"{stats['entries_removed']} removed, {stats['bytes_saved']} of {stats['bytes']} bytes saved")
+    print(f"Pruning removed {report['entries_removed']} entries, {report['bytes_saved']} bytes")
+    for n, stats in report.get('perplexity', {}).items():
+        print(f"{n}-gram held-out perplexity: {stats['unpruned']:.4f} -> {stats['pruned']:.4f} ({stats['change']:+.2%})")
+    if 'top_k_agreement' in report:
+        print(f"Top-k agreement with the unpruned model: {report['top_k_agreement']:.2%}")
 
-# --- 4. Main Execution Block (Simplified and Fixed) ---
+# --- 8. Main Execution Block (Simplified and Fixed) ---
 
 if __name__ =="__main__":
     
@@ -300,32 +1092,64 @@ if __name__ =="__main__":
         
         file_path = TRAIN_DATA_PATH # Fixed: Use the configured raw string path
         
-        try:
-            # Fixed: Ensure encoding="utf-8" is used for robust file reading
-            with open(file_path, "r", encoding="utf-8") as f:
-                train_data = f.read()
-        except FileNotFoundError:
+        if not os.path.exists(file_path):
             print(f"Error: The file '{file_path}' was not found. Check path.")
             sys.exit(1)
-
-        # Using a small placeholder test data for preprocessing consistency
-        test_data = "The sky is clear and blue." 
         
-        tokenized_train_sentences, _, vocabulary = preprocess_data(train_data, test_data, count_threshold = 2)
-        et = time.time()
-        print(f"Preprocessing time: {et-st:.4f}s")
+        if COUNTING_MODE == "external":
+            # Raw counts past the RAM cap go to sorted runs on disk, merged into the tables at the end
+            from ExternalCount_mod import ExternalNGramCounter, print_spill_report
+            from Merge_mod import write_count_shard, merge_count_shards, threshold_n_gram_sections
+            with ExternalNGramCounter(max_n = 4, memory_mb = COUNT_MEMORY_MB) as counter:
+                counter.add_sentences(stream_tokenized_sentences(file_path))
+                sections = counter.sections()
+                if COUNTS_FILE:
+                    write_count_shard(COUNTS_FILE, sections, meta={'source': os.path.basename(file_path), 'max_n': 4})
+                    print(f"Raw counts saved to {COUNTS_FILE}")
+                    sections = merge_count_shards([COUNTS_FILE])
+                vocabulary, n_gram_counts_list = threshold_n_gram_sections(sections, count_threshold = 2)
+                print_spill_report(counter.stats())
+        else:
+            if COUNTING_MODE == "sketch":
+                # Approximate counts of the N-grams seen at least twice, checked against exact counts on a sample
+                from Sketch_mod import SketchNGramCounter, reservoir_sample, sketch_error_report, print_sketch_report
+                counter = SketchNGramCounter(max_n = 4)
+                sample = []
+                counter.add_sentences(reservoir_sample(stream_tokenized_sentences(file_path), sample))
+                raw_counts_list = counter.raw_counts_list()
+                print_sketch_report(counter.stats(), sketch_error_report(sample, counter))
+            else:
+                # Tokenizing and counting all orders (up to N=4) runs sharded across worker processes
+                raw_counts_list = count_raw_n_grams_parallel(file_path, max_n = 4)
+            if COUNTS_FILE:
+                from Merge_mod import write_count_shard
+                write_count_shard(COUNTS_FILE, dict(enumerate(raw_counts_list, start=1)),
+                                  meta={'source': os.path.basename(file_path), 'max_n': 4,
+                                        'approximate': COUNTING_MODE == "sketch"})
+                print(f"Raw counts saved to {COUNTS_FILE}")
+            vocabulary, n_gram_counts_list = apply_count_threshold(raw_counts_list, count_threshold = 2)
         
-        n_gram_counts_list = []
-        # Loop up to N=4 (for 1-gram, 2-gram, 3-gram, 4-gram)
-        for n in range(1, 5): 
-            n_gram_counts = count_n_grams(tokenized_train_sentences, n)
-            n_gram_counts_list.append(n_gram_counts)
-            
         sst = time.time()
-        print(f"N-gram counting time: {sst-et:.4f}s")
+        print(f"Preprocessing + N-gram counting time: {sst-st:.4f}s")
+        
+        tables = build_suggestion_tables(vocabulary, n_gram_counts_list)
+        print(f"Suggestion table build time: {time.time()-sst:.4f}s")
+        model = NGramModel(vocabulary, n_gram_counts_list, tables=tables)
+        
+        # --- PRUNING (optional) ---
+        if PRUNE_COUNT_THRESHOLDS or PRUNE_ENTROPY_THRESHOLD is not None:
+            pst = time.time()
+            pruned_list = prune_n_gram_counts(n_gram_counts_list, PRUNE_COUNT_THRESHOLDS, PRUNE_ENTROPY_THRESHOLD,
+                                              vocabulary_size=model.vocabulary_size)
+            pruned_model = NGramModel(vocabulary, pruned_list, tables=build_suggestion_tables(vocabulary, pruned_list),
+                                      version=model.version)
+            print(f"Pruning time: {time.time()-pst:.4f}s")
+            heldout = list(stream_tokenized_sentences(PRUNE_HELDOUT_PATH)) if PRUNE_HELDOUT_PATH else None
+            print_pruning_report(pruning_report(model, pruned_model, heldout))
+            model = pruned_model
         
         # --- SAVE THE MODEL ---
-        save_model(vocabulary, n_gram_counts_list, MODEL_FILE) 
+        save_model(model, MODEL_FILE) 
         print(f"Total training time: {time.time() - st:.4f}s")
     
     # --- PREDICTION / DEPLOYMENT MODE (Simplified) ---
@@ -334,15 +1158,15 @@ if __name__ =="__main__":
         st = time.time()
         
         # Load the model data
-        vocabulary, n_gram_counts_list = load_model(MODEL_FILE)
+        model = load_model(MODEL_FILE)
         
-        if not vocabulary or not n_gram_counts_list:
+        if model is None or not model.vocabulary or not model.n_gram_counts_list:
             print("Cannot run in prediction mode without a trained model file. Please set TRAINING_MODE = True and run once.")
             sys.exit(1)
             
         et = time.time()
         print(f"Model loading time: {et-st:.4f}s")
-        print(f"Vocab size: {len(vocabulary)}")
+        print(f"Vocab size: {len(model.vocabulary)} (order {model.order}, version {model.version})")
 
         
         # --- FIXED PREDICTION EXAMPLE ---
@@ -362,29 +1186,14 @@ if __name__ =="__main__":
         # 2. Process the tokens to replace OOV words with <UNK>
         # Note: replace_oov_words_by_unk expects a list of tokenized sentences, 
         # so we pass it [context_words] and extract the first (and only) sentence back out.
-        input_tokens_processed = replace_oov_words_by_unk([context_words], vocabulary)[0]
+        input_tokens_processed = replace_oov_words_by_unk([context_words], model.vocabulary)[0]
         
         print(f"\nEvaluating sequence and predicting next word after context: {' '.join(context_words)}")
         
         # --- PERPLEXITY CALCULATION ---
-        # To use the 3-gram model (N=3):
-        # We need N-gram (context/denominator) counts: 2-gram (Index 1)
-        # We need (N+1)-gram (numerator) counts: 3-gram (Index 2)
-        
-        # Index 1 holds 2-gram counts (N-1 for 3-gram model)
-        n_minus1_counts = n_gram_counts_list[1] 
-        # Index 2 holds 3-gram counts (N for 3-gram model)
-        n_counts = n_gram_counts_list[2] 
-        # Vocabulary size must include special tokens (</s> and <UNK>)
-        vocab_size_for_ppl = len(vocabulary) + 2
-
-        # Calculate Perplexity for the input sequence
-        perplexity = calculate_perplexity(
-            input_tokens_processed, 
-            n_minus1_counts, 
-            n_counts, 
-            vocab_size_for_ppl
-        )
+        # To use the 3-gram model (N=3): 2-gram counts (Index 1) are the context/denominator,
+        # 3-gram counts (Index 2) the numerator; the model supplies its vocabulary size.
+        perplexity = model.perplexity(input_tokens_processed, 3)
         
         print(f"\n--- Perplexity Score (using 3-gram model) ---")
         print(f"Sequence Perplexity: {perplexity:.4f}")
@@ -392,7 +1201,7 @@ if __name__ =="__main__":
         # --- SUGGESTIONS CALCULATION ---
         sst = time.time()
         # Predict the next word (no prefix is being typed in this simplified example)
-        suggestions = get_suggestions(input_tokens_processed, n_gram_counts_list, vocabulary, k=1.0, start_with=None)
+        suggestions = model.suggest(input_tokens_processed, k=1.0, start_with=None)
         tt = time.time()
         
         print(f"Time taken for suggestions: {tt-sst:.4f}s")
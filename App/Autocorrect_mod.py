@@ -6,50 +6,92 @@ import os
 import pickle
 import sys
 import time
+from Metrics_mod import StageTimer, AUTOCORRECT_CANDIDATES
 
 # --- CONFIGURATION ---
 TRAINING_MODE = False  # Set to True once to train and save; Set to False for deployment
 MODEL_FILE = "Autocorrect-Autocomplete-for-typing/App/data/autocorrect_model_data.pkl"
+# Word counts written by training, mergeable with other runs' (see Merge_mod.py); None = off
+COUNTS_FILE = None
+# Symmetric-delete index: max deletes per side and the prefix length the deletes are taken from
+DELETE_INDEX_DISTANCE = 2
+DELETE_INDEX_PREFIX = 7
+# Trie search: most edits (insertions, deletions or replacements, each counted once) a correction may be away
+TRIE_MAX_EDITS = 3
+# Below this many suggestions their MEDs are computed one at a time (min_edit_distance):
+# stacking the matrices in batch_min_edit_distance only pays off for more
+BATCH_MED_MIN_CANDIDATES = 5
+# Noisy-channel mode (keyboard=True): replacing a letter by a key next to it on this keyboard
+# costs ADJACENT_REP_COST instead of rep_cost, and likely edits are tried first
+KEYBOARD_ROWS = ("qwertyuiop", "asdfghjkl", "zxcvbnm")
+ADJACENT_REP_COST = 1
 # ---------------------
 
 # --- NEW: Model Persistence Functions ---
 
-def save_model_autocorrect(vocab, probs, filename=MODEL_FILE):
-    """Saves vocabulary set and probability dictionary to a pickle file."""
+def save_model_autocorrect(vocab, probs, filename=MODEL_FILE, delete_index=None, counts=None):
+    """
+    Saves vocabulary set, probability dictionary and (optionally) the delete index and the
+    word counts behind probs to a pickle file. Online updates need the counts.
+    """
     data = {
         'vocab': vocab,
         'probs': probs
     }
+    if delete_index is not None:
+        data['delete_index'] = delete_index
+    if counts is not None:
+        data['counts'] = dict(counts)
     with open(filename, 'wb') as f:
         pickle.dump(data, f)
     print(f"\nAutocorrect model data successfully saved to {filename}")
 
-def load_model_autocorrect(filename=MODEL_FILE):
-    """Loads vocabulary set and probability dictionary from a pickle file."""
+def load_model_autocorrect(filename=MODEL_FILE, with_index=False, with_counts=False):
+    """
+    Loads vocabulary set and probability dictionary from a pickle file.
+    With with_index=True the symmetric-delete index is returned as a third value;
+    it is built on the fly if the model file predates it.
+    With with_counts=True the probabilities come back as a CountProbs over the saved word
+    counts (for online updates), if the model file has them.
+    """
     try:
         with open(filename, 'rb') as f:
             data = pickle.load(f)
         print(f"\nAutocorrect model data successfully loaded from {filename}")
-        return data['vocab'], data['probs']
+        probs = data['probs']
+        if with_counts and 'counts' in data:
+            probs = CountProbs(data['counts'])
+        if not with_index:
+            return data['vocab'], probs
+        delete_index = data.get('delete_index')
+        if delete_index is None:
+            print("Model file has no delete index, building it now.")
+            delete_index = build_delete_index(data['vocab'])
+        return data['vocab'], probs, delete_index
     except FileNotFoundError:
         print(f"Error: Model file {filename} not found. Must train the model first.")
+        if with_index:
+            return None, None, None
         return None, None
 
 # --- Core Autocorrect Functions ---
 
+def stream_words(file_name):
+    """
+    Yields the lowercase words of a file one line at a time. Words never span lines, so this
+    gives the same words as lowercasing and tokenizing the whole file at once.
+    """
+    with open(file_name, 'r',encoding='utf-8') as file:
+        for line in file:
+            yield from re.findall(r'\w+', line.lower())
+
 def process_data(file_name):
     """Reads file, converts to lowercase, and tokenizes into a list of words."""
-    words = []
     try:
-        with open(file_name, 'r',encoding='utf-8') as file:
-            file_content = file.read()
+        return list(stream_words(file_name))
     except FileNotFoundError:
         print(f"Error: Training file not found at {file_name}")
         return []
-        
-    file_content = file_content.lower()
-    words = re.findall(r'\w+', file_content )
-    return words
 
 def get_count(word_l):
     """
@@ -66,6 +108,46 @@ def get_probs(word_count_dict):
         probs[word] = word_count_dict[word] / M
     return probs
 
+class CountProbs:
+    """
+    {word: probability} map backed by word counts and their total, for models updated online:
+    get_probs divides every count by the corpus total, so adding words would mean re-dividing
+    all of them; here the division happens on lookup and an update only touches the words it adds.
+    """
+    def __init__(self, counts, total=None):
+        self.counts = counts
+        self.total = total if total is not None else sum(counts.values())
+
+    def add(self, words):
+        """Counts every word in words once more."""
+        for word in words:
+            self.counts[word] = self.counts.get(word, 0) + 1
+            self.total += 1
+
+    def get(self, word, default=None):
+        count = self.counts.get(word)
+        return default if count is None else count / self.total
+
+    def __getitem__(self, word):
+        return self.counts[word] / self.total
+
+    def __contains__(self, word):
+        return word in self.counts
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __iter__(self):
+        return iter(self.counts)
+
+    def items(self):
+        total = self.total
+        return ((word, count / total) for word, count in self.counts.items())
+
+    def to_dict(self):
+        """The plain probs dict that get_probs would return for the current counts."""
+        return dict(self.items())
+
 def delete_letter(word,verbose = False):
     """Returns a list of all words with one letter deleted."""
     delete_l = []
@@ -143,8 +225,111 @@ def edit_two_letters(word, allow_switches = True):
             edit_two_set.update(edit_two)
     return set(edit_two_set)
 
-def min_edit_distance(source,target, ins_cost = 1, del_cost = 1, rep_cost = 2):
-    """Calculates the Minimum Edit Distance (Levenshtein distance with custom costs)."""
+# --- Symmetric-Delete Index (SymSpell-style) ---
+
+def get_deletes(word, max_distance=DELETE_INDEX_DISTANCE, prefix_length=DELETE_INDEX_PREFIX):
+    """Returns the set of strings made by deleting up to max_distance letters from the word's prefix."""
+    prefix = word[:prefix_length]
+    deletes = {prefix}
+    frontier = {prefix}
+    for _ in range(max_distance):
+        frontier = {d for w in frontier for d in delete_letter(w)}
+        deletes.update(frontier)
+    return deletes
+
+def build_delete_index(vocab, max_distance=DELETE_INDEX_DISTANCE, prefix_length=DELETE_INDEX_PREFIX):
+    """
+    Maps every delete-variant of every vocabulary word to the words that produce it.
+    Two words within max_distance edits of each other always share a delete-variant,
+    so lookups never need to generate insertions or replacements.
+    """
+    delete_index = {}
+    for w in vocab:
+        for d in get_deletes(w, max_distance, prefix_length):
+            delete_index.setdefault(d, []).append(w)
+    return delete_index
+
+def add_to_delete_index(delete_index, words, max_distance=DELETE_INDEX_DISTANCE, prefix_length=DELETE_INDEX_PREFIX):
+    """Adds new vocabulary words to a delete index built by build_delete_index, in place."""
+    for w in words:
+        for d in get_deletes(w, max_distance, prefix_length):
+            delete_index.setdefault(d, []).append(w)
+
+def lookup_delete_index(word, delete_index, max_distance=DELETE_INDEX_DISTANCE, prefix_length=DELETE_INDEX_PREFIX):
+    """Returns the vocabulary words sharing a delete-variant with 'word' (a superset of its neighbours)."""
+    candidates = set()
+    for d in get_deletes(word, max_distance, prefix_length):
+        candidates.update(delete_index.get(d, ()))
+    return candidates
+
+def known_words(candidates, vocab):
+    """
+    The candidates that are vocabulary words. A set vocabulary is intersected directly; any other
+    (e.g. a memory-mapped StringTable) is probed once per candidate, never iterated.
+    """
+    if isinstance(vocab, (set, frozenset)):
+        return candidates.intersection(vocab)
+    return {w for w in candidates if w in vocab}
+
+def is_one_edit(source, target, letters='abcdefghijklmnopqrstuvwxyz'):
+    """True if 'target' is in edit_one_letter(source), without generating that set."""
+    m = len(source)
+    n = len(target)
+    if n == m - 1:
+        i = 0
+        while i < n and source[i] == target[i]:
+            i += 1
+        return source[i+1:] == target[i:]
+    if n == m + 1:
+        i = 0
+        while i < m and source[i] == target[i]:
+            i += 1
+        return target[i] in letters and target[i+1:] == source[i:]
+    if n != m:
+        return False
+    diff = [i for i in range(m) if source[i] != target[i]]
+    if not diff:
+        # Only a switch of two equal neighbours maps a word onto itself
+        return any(source[i] == source[i+1] for i in range(m - 1))
+    if len(diff) == 1:
+        return target[diff[0]] in letters
+    if len(diff) == 2:
+        i, j = diff
+        return j == i + 1 and source[i] == target[j] and source[j] == target[i]
+    return False
+
+def is_two_edits(source, target, edit_one=None, letters='abcdefghijklmnopqrstuvwxyz'):
+    """
+    True if 'target' is in edit_two_letters(source). Works backwards from the target:
+    builds every string one edit before it and checks it against edit_one_letter(source).
+    """
+    if edit_one is None:
+        edit_one = edit_one_letter(source)
+    # Strings in edit_one only contain letters of the source or the edit alphabet
+    alphabet = set(source) | set(letters)
+    n = len(target)
+    previous = set()
+    for i in range(n + 1):
+        a, b = target[:i], target[i:]
+        # target = delete_letter(m)
+        previous.update(a + x + b for x in alphabet)
+        if b:
+            if b[0] in letters:
+                # target = insert_letter(m)
+                previous.add(a + b[1:])
+                # target = replace_letter(m)
+                previous.update(a + x + b[1:] for x in alphabet if x != b[0])
+            if len(b) > 1:
+                # target = switch_leter(m)
+                previous.add(a + b[1] + b[0] + b[2:])
+    previous.discard('')
+    return not previous.isdisjoint(edit_one)
+
+def min_edit_distance(source,target, ins_cost = 1, del_cost = 1, rep_cost = 2, rep_costs = None):
+    """
+    Calculates the Minimum Edit Distance (Levenshtein distance with custom costs).
+    rep_costs, a substitution cost table (see build_substitution_costs), replaces rep_cost.
+    """
     m = len(source)
     n = len(target)
     
@@ -159,6 +344,8 @@ def min_edit_distance(source,target, ins_cost = 1, del_cost = 1, rep_cost = 2):
     for row in range(1,m+1):
         for col in range(1,n+1):
             r_cost = rep_cost
+            if rep_costs is not None:
+                r_cost = rep_costs[min(ord(source[row-1]), 127), min(ord(target[col-1]), 127)]
             if source[row-1] == target[col-1]:
                 r_cost = 0
             D[row,col] = min(D[row-1,col] + del_cost,
@@ -167,31 +354,197 @@ def min_edit_distance(source,target, ins_cost = 1, del_cost = 1, rep_cost = 2):
     med = D[m,n]
     return D, med
 
-def get_corrections_by_med(word, probs, vocab, n=3, verbose = True, display_matrix = False):
+def batch_min_edit_distance(source, targets, ins_cost = 1, del_cost = 1, rep_cost = 2, max_distance = None, rep_costs = None):
+    """
+    Calculates the MED from 'source' to every string in 'targets' at once (same costs as
+    min_edit_distance, including rep_costs) and returns them as an array in the order of 'targets'.
+    The matrices of all targets are stacked and filled one anti-diagonal at a time. With
+    max_distance set, a target is dropped as soon as every cell its path can still go through
+    exceeds the cutoff; its entry is then max_distance + 1.
+    """
+    m = len(source)
+    K = len(targets)
+    dtype = int if rep_costs is None else np.result_type(int, rep_costs.dtype)
+    meds = np.full(K, -1 if max_distance is None else max_distance + 1, dtype=dtype)
+    if K == 0:
+        return meds
+    
+    lens = np.array([len(t) for t in targets], dtype=int)
+    n = int(lens.max())
+    src = np.array([ord(ch) for ch in source], dtype=np.int64)
+    tgt = np.zeros((K, n), dtype=np.int64)
+    for k, t in enumerate(targets):
+        tgt[k, :len(t)] = [ord(ch) for ch in t]
+    ids = np.arange(K)
+    if rep_costs is not None:
+        # Row/column of every character in the cost table (past ASCII they share the last one)
+        src_keys, tgt_keys = np.minimum(src, 127), np.minimum(tgt, 127)
+    
+    D = np.empty((K, m+1, n+1), dtype=dtype)
+    D[:, :, 0] = np.arange(m+1) * del_cost
+    D[:, 0, :] = np.arange(n+1) * ins_cost
+    
+    for d in range(m + n + 1):
+        # Interior cells of anti-diagonal d (row + col == d)
+        rows = np.arange(max(1, d-n), min(m, d-1) + 1)
+        if len(rows):
+            cols = d - rows
+            if rep_costs is None:
+                r_cost = (src[rows-1][None, :] != tgt[:, cols-1]) * rep_cost
+            else:
+                r_cost = np.where(src[rows-1][None, :] == tgt[:, cols-1], 0,
+                                  rep_costs[src_keys[rows-1][None, :], tgt_keys[:, cols-1]])
+            D[:, rows, cols] = np.minimum(np.minimum(D[:, rows-1, cols] + del_cost,
+                                                     D[:, rows, cols-1] + ins_cost),
+                                          D[:, rows-1, cols-1] + r_cost)
+        
+        # Targets whose last cell (m, len) lies on this diagonal are finished
+        done = lens == d - m
+        if done.any():
+            meds[ids[done]] = D[done, m, lens[done]]
+            if max_distance is not None:
+                meds[ids[done]] = np.minimum(meds[ids[done]], max_distance + 1)
+            keep = ~done
+        else:
+            keep = None
+        
+        if max_distance is not None:
+            # Every remaining path goes through diagonal d, or jumps over it from d - 1
+            lower = np.full(len(ids), max_distance + 1)
+            for diag in (d - 1, d):
+                rows = np.arange(max(0, diag-n), min(m, diag) + 1)
+                cols = diag - rows
+                cells = np.where(cols[None, :] <= lens[:, None], D[:, rows, cols], max_distance + 1)
+                lower = np.minimum(lower, cells.min(axis=1, initial=max_distance + 1))
+            alive = lower <= max_distance
+            keep = alive if keep is None else keep & alive
+        
+        if keep is not None and not keep.all():
+            D, tgt, lens, ids = D[keep], tgt[keep], lens[keep], ids[keep]
+            if rep_costs is not None:
+                tgt_keys = tgt_keys[keep]
+            if len(ids) == 0:
+                break
+    return meds
+
+def get_corrections_by_med(word, probs, vocab, n=3, verbose = True, display_matrix = False, delete_index = None,
+                           keyboard = False):
     """
     Generates autocorrection suggestions by checking edit distance 1 and 2,
     then sorts by MED (ascending) and probability (descending).
+    If a delete_index (see build_delete_index) is given, candidates are looked up
+    in it instead of generating every string one and two edits away.
+    keyboard=True ranks with the keyboard substitution costs (see Keyboard Noisy Channel below)
+    and, without an index, checks the likeliest edits first and stops once n words are found.
+    """
+    return get_corrections_by_med_until(word, probs, vocab, None, n=n, verbose=verbose, display_matrix=display_matrix,
+                                        delete_index=delete_index, keyboard=keyboard)[0]
+
+def get_corrections_by_med_until(word, probs, vocab, deadline, n=3, verbose = True, display_matrix = False,
+                                 delete_index = None, keyboard = False):
+    """
+    get_corrections_by_med with a time budget: deadline is a time.perf_counter() value (None = unbounded),
+    so one budget can be shared by several calls. The candidate search stops when it runs out, the
+    candidates found so far are ranked, and (suggestions, partial) is returned.
     """
+    partial = False
     suggestions_set = set()
+    # Time per stage: candidate generation, checking candidates against the vocabulary, MED, sorting
+    timer = StageTimer('autocorrect')
+    checked = 0
+    # Edits between the word and its suggestions: 2 once the distance-2 search runs
+    edits = 1
     
     # 1. Check if word is already correct
     if word in vocab:
         suggestions_set.add(word)
     
-    # 2. Check edit distance 1
-    suggestions_set.update(edit_one_letter(word).intersection(vocab))
-    
-    # 3. Check edit distance 2 (only if no suggestions found in step 1 or 2)
-    if not suggestions_set:
-        suggestions_set.update(edit_two_letters(word).intersection(vocab))
+    if delete_index is not None:
+        # 2./3. Same candidates as below, verified from the index's neighbours. Keyboard mode only changes
+        # the ranking here: generating the likely edits to stop early costs more than verifying them all
+        candidates = lookup_delete_index(word, delete_index)
+        timer.lap('candidates')
+        checked += len(candidates)
+        for c in candidates:
+            if deadline is not None and time.perf_counter() > deadline:
+                partial = True
+                break
+            if is_one_edit(word, c):
+                suggestions_set.add(c)
+        timer.lap('intersection')
+        if not suggestions_set and not partial:
+            edits = 2
+            edit_one = edit_one_letter(word)
+            timer.lap('candidates')
+            checked += len(candidates)
+            for c in candidates:
+                if deadline is not None and time.perf_counter() > deadline:
+                    partial = True
+                    break
+                if is_two_edits(word, c, edit_one):
+                    suggestions_set.add(c)
+            timer.lap('intersection')
+    else:
+        # 2. Check edit distance 1 (keyboard mode: the likely edits, and the rest only if fewer than n are words)
+        edit_one = []
+        for tier in (keyboard_edit_one_letter(word) if keyboard else [edit_one_letter(word)]):
+            if edit_one and deadline is not None and time.perf_counter() > deadline:
+                partial = True
+                break
+            timer.lap('candidates')
+            edit_one.append(tier)
+            checked += len(tier)
+            suggestions_set.update(known_words(tier, vocab))
+            timer.lap('intersection')
+            if len(suggestions_set) >= n:
+                break
+        
+        # 3. Check edit distance 2 (only if no suggestions found in step 1 or 2)
+        if not suggestions_set:
+            edits = 2
+        if not suggestions_set and not partial and deadline is None and not keyboard:
+            edit_two = edit_two_letters(word)
+            timer.lap('candidates')
+            checked += len(edit_two)
+            suggestions_set.update(known_words(edit_two, vocab))
+            timer.lap('intersection')
+        elif not suggestions_set and not partial:
+            # Same as edit_two_letters, one edit-one neighbour at a time so the deadline can be checked.
+            # Keyboard mode first tries the likely edits of the likely edits
+            if keyboard:
+                stages = [(edit_one[0], lambda w: next(keyboard_edit_one_letter(w))),
+                          (edit_one[0] | edit_one[1], edit_one_letter)]
+            else:
+                stages = [(edit_one[0], edit_one_letter)]
+            checked_two = set()
+            for neighbours, expand in stages:
+                if partial or len(suggestions_set) >= n:
+                    break
+                edit_two = set()
+                for w in neighbours:
+                    if deadline is not None and time.perf_counter() > deadline:
+                        partial = True
+                        break
+                    if w:
+                        edit_two.update(expand(w))
+                edit_two -= checked_two
+                timer.lap('candidates')
+                checked += len(edit_two)
+                suggestions_set.update(known_words(edit_two, vocab))
+                checked_two |= edit_two
+                timer.lap('intersection')
         
     suggestions = list(suggestions_set)
 
-    med_list = []
-    for s in suggestions:
-        # Calculate MED only for valid suggestions
-        D, med = min_edit_distance(word, s)
-        med_list.append((s, med, probs.get(s,0)))
+    # Calculate MED only for valid suggestions. Each of their edits costs at most 2 (a replacement,
+    # or a switch done as a delete and an insert), which bounds the batch's anti-diagonal cutoff
+    rep_costs = SUBSTITUTION_COSTS if keyboard else None
+    if len(suggestions) < BATCH_MED_MIN_CANDIDATES:
+        meds = [min_edit_distance(word, s, rep_costs=rep_costs)[1] for s in suggestions]
+    else:
+        meds = batch_min_edit_distance(word, suggestions, max_distance=2 * edits, rep_costs=rep_costs)
+    med_list = [(s, med, probs.get(s,0)) for s, med in zip(suggestions, meds)]
+    timer.lap('med')
     
     # Sort by min edit distance first (x[1] ascending), then by probability (-x[2] descending)
     med_list = sorted(med_list, key=lambda x: (x[1], -x[2]))
@@ -200,6 +553,10 @@ def get_corrections_by_med(word, probs, vocab, n=3, verbose = True, display_matr
     
     # Filter for output: only the word itself
     autocorrected_words = [w[0] for w in n_best]
+    timer.lap('sort')
+    timer.record()
+    engine = 'edits' if delete_index is None else 'delete_index'
+    AUTOCORRECT_CANDIDATES.observe(checked, engine=engine + ('_keyboard' if keyboard else ''))
     
     if verbose:
         print("entered word:", word)
@@ -208,7 +565,157 @@ def get_corrections_by_med(word, probs, vocab, n=3, verbose = True, display_matr
     if display_matrix:
         # Helper function for displaying matrix (not fully provided but included here for completeness)
         pass 
-        
+    
+    return autocorrected_words, partial
+
+# --- Keyboard Noisy Channel ---
+#
+# Most typos hit a key next to the intended one. In keyboard mode the MED charges the replacement
+# of a letter by a neighbouring key ADJACENT_REP_COST instead of rep_cost, looked up in a dense
+# substitution cost table indexed by character code, and the strings one edit away are generated
+# likeliest first, so that the search can stop as soon as n of them are words.
+
+def keyboard_neighbours(rows=KEYBOARD_ROWS):
+    """{letter: the letters on the keys around it} for keyboard rows staggered like QWERTY's."""
+    neighbours = {}
+    for r, row in enumerate(rows):
+        for i, ch in enumerate(row):
+            near = [row[j] for j in (i - 1, i + 1) if 0 <= j < len(row)]
+            # The row above is shifted half a key to the left, the row below half a key to the right
+            if r > 0:
+                near += [rows[r-1][j] for j in (i, i + 1) if j < len(rows[r-1])]
+            if r + 1 < len(rows):
+                near += [rows[r+1][j] for j in (i - 1, i) if 0 <= j < len(rows[r+1])]
+            neighbours[ch] = ''.join(near)
+    return neighbours
+
+def build_substitution_costs(rep_cost=2, adjacent_cost=ADJACENT_REP_COST, rows=KEYBOARD_ROWS):
+    """
+    The (128, 128) table of substitution costs by character code (rep_costs of the MED functions):
+    adjacent_cost between neighbouring keys, in either case, and rep_cost everywhere else. Codes
+    past ASCII share row and column 127; the MED checks equal characters before the table.
+    """
+    costs = np.full((128, 128), rep_cost, dtype=int)
+    np.fill_diagonal(costs[:127, :127], 0)
+    for ch, near in keyboard_neighbours(rows).items():
+        for other in near:
+            costs[ord(ch), ord(other)] = adjacent_cost
+            costs[ord(ch.upper()), ord(other.upper())] = adjacent_cost
+    return costs
+
+def cheap_substitutions(costs, rep_cost=2, letters='abcdefghijklmnopqrstuvwxyz'):
+    """{letter: the letters typed instead of it at less than rep_cost, itself included}."""
+    return {ch: frozenset(l for l in letters if costs[ord(ch), ord(l)] < rep_cost) for ch in letters}
+
+SUBSTITUTION_COSTS = build_substitution_costs()
+NEAR_LETTERS = cheap_substitutions(SUBSTITUTION_COSTS)
+
+def keyboard_edit_one_letter(word, allow_switches=True, near_letters=NEAR_LETTERS):
+    """
+    Yields the strings one edit away from 'word' (edit_one_letter) as two sets, likeliest first:
+    deletions, switches, replacements by a near letter (see cheap_substitutions) and insertions
+    of a letter near one around the gap (a neighbouring or doubled key); then every other
+    replacement and insertion, only generated when asked for.
+    """
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    near = {ch: near_letters.get(ch, frozenset()) for ch in word}
+    split_l = [(word[:i], word[i:]) for i in range(len(word)+1)]
+    likely = set(delete_letter(word))
+    if allow_switches:
+        likely.update(switch_leter(word))
+    for a, b in split_l:
+        gap = (near[a[-1]] if a else frozenset()) | (near[b[0]] if b else frozenset())
+        likely.update(a + l + b for l in gap)
+        if b:
+            likely.update(a + l + b[1:] for l in near[b[0]] if l != b[0])
+    yield likely
+    
+    unlikely = set()
+    for a, b in split_l:
+        unlikely.update(a + l + b for l in letters)
+        if b:
+            unlikely.update(a + l + b[1:] for l in letters if l != b[0])
+    yield unlikely - likely
+
+# --- Trie Search Engine (bounded Levenshtein) ---
+
+def build_vocab_trie(vocab):
+    """Builds a nested-dict trie of the vocabulary; the None key of a node holds the word ending there."""
+    return add_to_vocab_trie({}, vocab)
+
+def add_to_vocab_trie(trie, words, copy=False):
+    """
+    Adds words to a trie from build_vocab_trie and returns it: in place, or with copy=True as a
+    new trie sharing every node off the paths of the new words, so that searches running on the
+    old one (e.g. while words are learned online) never see a node change.
+    """
+    root = dict(trie) if copy else trie
+    fresh = {id(root)}
+    for w in words:
+        node = root
+        for ch in w:
+            child = node.get(ch)
+            if child is None:
+                child = {}
+                fresh.add(id(child))
+            elif copy and id(child) not in fresh:
+                child = dict(child)
+                fresh.add(id(child))
+            node[ch] = child
+            node = child
+        node[None] = w
+    return root
+
+def search_vocab_trie(word, trie, probs, max_edits=TRIE_MAX_EDITS, ins_cost=1, del_cost=1, rep_cost=2):
+    """
+    Returns (word, med, prob) tuples for every vocabulary word within max_edits edits of 'word'.
+    Each trie edge adds one column of two matrices: the edit count (Levenshtein distance) that
+    bounds the search, and the min_edit_distance one that is reported. A branch is dropped as
+    soon as its edit column minimum exceeds max_edits, since no descendant can do better.
+    """
+    m = len(word)
+    first_col = list(range(m + 1))
+    results = []
+    stack = [(trie, first_col, [row * del_cost for row in range(m + 1)])]
+    scored = 0
+    while stack:
+        node, prev, prev_med = stack.pop()
+        for ch, child in node.items():
+            if ch is None:
+                continue
+            scored += 1
+            col = [prev[0] + 1]
+            med_col = [prev_med[0] + ins_cost]
+            for row in range(1, m + 1):
+                same = word[row-1] == ch
+                col.append(min(prev[row] + 1,
+                               col[row-1] + 1,
+                               prev[row-1] + (0 if same else 1)))
+                med_col.append(min(prev_med[row] + ins_cost,
+                                   med_col[row-1] + del_cost,
+                                   prev_med[row-1] + (0 if same else rep_cost)))
+            if min(col) > max_edits:
+                continue
+            target = child.get(None)
+            if target is not None and col[m] <= max_edits:
+                results.append((target, med_col[m], probs.get(target, 0)))
+            stack.append((child, col, med_col))
+    # Trie nodes play the part of the candidates checked by the other engines
+    AUTOCORRECT_CANDIDATES.observe(scored, engine='trie')
+    return results
+
+def get_corrections_by_trie(word, probs, trie, n=3, max_edits=TRIE_MAX_EDITS, verbose = True):
+    """
+    Alternative to get_corrections_by_med: scores the whole vocabulary trie within max_edits
+    instead of generating edit candidates, then sorts by MED (ascending) and probability (descending).
+    """
+    med_list = search_vocab_trie(word, trie, probs, max_edits=max_edits)
+    med_list = sorted(med_list, key=lambda x: (x[1], -x[2]))
+    autocorrected_words = [w[0] for w in med_list[:n]]
+    
+    if verbose:
+        print("entered word:", word)
+        print("suggestions:", autocorrected_words)
     return autocorrected_words
 
 if __name__ == "__main__":
@@ -218,27 +725,37 @@ if __name__ == "__main__":
         st = time.time()
         
         file_path = 'Autocorrect and Autocomplete/App/data/AllCombined.txt'
-        word_l = process_data(file_path)
+        if not os.path.exists(file_path):
+            print(f"Error: Training file not found at {file_path}")
+            sys.exit(1)
         
-        if not word_l:
+        # Words are counted as they stream in; the corpus is never held in memory
+        word_count_dict = get_count(stream_words(file_path)) # FAST Counter
+        if not word_count_dict:
             sys.exit(1)
             
-        vocab = set(word_l)
-        word_count_dict = get_count(word_l) # FAST Counter
+        if COUNTS_FILE:
+            from Merge_mod import write_count_shard
+            write_count_shard(COUNTS_FILE, {'words': dict(word_count_dict)}, meta={'source': os.path.basename(file_path)})
+        
+        vocab = set(word_count_dict)
         probs = get_probs(word_count_dict)
         
         et = time.time()
         print(f"Training Time (Processing + Counting + Probs): {et-st:.4f}s")
         
+        delete_index = build_delete_index(vocab)
+        print(f"Delete index build time: {time.time()-et:.4f}s ({len(delete_index)} keys)")
+        
         # --- SAVE THE MODEL ---
-        save_model_autocorrect(vocab, probs, MODEL_FILE)
+        save_model_autocorrect(vocab, probs, MODEL_FILE, delete_index=delete_index, counts=word_count_dict)
         # ----------------------
         
     # --- PREDICTION / DEPLOYMENT MODE ---
     else:
         print("--- Starting Prediction Mode (Loading Model) ---")
         st = time.time()
-        vocab, probs = load_model_autocorrect(MODEL_FILE)
+        vocab, probs, delete_index = load_model_autocorrect(MODEL_FILE, with_index=True)
         
         if not vocab:
             print("Cannot run in prediction mode without a trained model file.")
@@ -251,7 +768,7 @@ if __name__ == "__main__":
         word = input("\nEnter a word for autocorrection: ")
         
         sst = time.time()
-        corrections = get_corrections_by_med(word, probs, vocab, n=3, verbose=True, display_matrix=False)
+        corrections = get_corrections_by_med(word, probs, vocab, n=3, verbose=True, display_matrix=False, delete_index=delete_index)
         tt = time.time()
         
         print(f"Correction Time: {tt-sst:.4f}s")
@@ -0,0 +1,169 @@
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# --- CONFIGURATION ---
+# Entries kept per in-process cache, and how long (seconds) an entry stays valid.
+CACHE_MAX_ENTRIES = 50000
+CACHE_TTL = 600
+# Entries kept in a shared cache file, and how many writes go by between two trims of it.
+SHARED_CACHE_MAX_ENTRIES = 500000
+SHARED_CACHE_TRIM_EVERY = 1000
+# ---------------------
+
+# --- 1. Shared Cache File ---
+#
+# Several worker processes (e.g. gunicorn workers) each hold their own ResultCache; pointing them at
+# the same SharedCache file lets one worker reuse results computed by another. It is a SQLite table
+# of JSON values with an absolute expiry time. Every error (e.g. a locked database) counts as a miss.
+
+class SharedCache:
+    """Cache entries shared between processes through a local SQLite file."""
+    def __init__(self, filename, max_entries=SHARED_CACHE_MAX_ENTRIES):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.writes = 0
+        self.evictions = 0
+        self.local = threading.local()
+        with self.connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, expires REAL, written REAL)")
+            db.execute("CREATE INDEX IF NOT EXISTS entries_written ON entries (written)")
+
+    def connection(self):
+        """One connection per thread, as SQLite connections cannot be shared between threads."""
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.filename, timeout=0.1)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")
+            self.local.db = db
+        return db
+
+    def get(self, key):
+        """Returns the value stored under key, or None if it is missing or expired."""
+        try:
+            row = self.connection().execute("SELECT value FROM entries WHERE key = ? AND expires > ?",
+                                            (key, time.time())).fetchone()
+        except sqlite3.Error:
+            return None
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value, ttl):
+        """Stores a JSON-serializable value; the oldest writes are evicted past max_entries."""
+        now = time.time()
+        try:
+            with self.connection() as db:
+                db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, json.dumps(value), now + ttl, now))
+                self.writes += 1
+                if self.writes % SHARED_CACHE_TRIM_EVERY == 0:
+                    self.trim(db, now)
+        except sqlite3.Error:
+            pass
+
+    def trim(self, db, now):
+        """Drops expired entries, then the oldest ones above max_entries."""
+        db.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+        excess = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+        if excess > 0:
+            db.execute("DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY written LIMIT ?)", (excess,))
+            self.evictions += excess
+
+
+# --- 2. In-process Result Cache ---
+
+class ResultCache:
+    """
+    Bounded LRU cache of computed results with a time-to-live, for one kind of result.
+    Entries belong to a model version: set_version with a new version drops them all.
+    On a local miss the optional SharedCache is tried before the result counts as a miss.
+    """
+    def __init__(self, name, version=None, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, shared=None):
+        self.name = name
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        # key -> (expiry time, value), least recently used first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.shared_hits = self.misses = 0
+        self.evictions = self.expirations = self.invalidations = 0
+
+    def set_version(self, version):
+        """Switches to another model version, dropping every entry computed with the old one."""
+        if version == self.version:
+            return
+        with self.lock:
+            if self.version is not None:
+                self.invalidations += 1
+            self.entries.clear()
+            self.version = version
+
+    def shared_key(self, key):
+        return json.dumps([self.name, self.version, key])
+
+    def get(self, key):
+        """Returns the cached value for key, or None on a miss."""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[key]
+                self.expirations += 1
+        if self.shared is not None:
+            value = self.shared.get(self.shared_key(key))
+            if value is not None:
+                self.store(key, value, now)
+                with self.lock:
+                    self.shared_hits += 1
+                return value
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """Caches value (which must be JSON-serializable when a shared cache is used)."""
+        self.store(key, value, time.monotonic())
+        if self.shared is not None:
+            self.shared.put(self.shared_key(key), value, self.ttl)
+
+    def store(self, key, value, now):
+        with self.lock:
+            self.entries[key] = (now + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached value for key, calling compute() and caching its result on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        """Counters for sizing the cache; hit_rate counts shared hits as hits."""
+        with self.lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'version': self.version,
+                'size': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'shared_evictions': self.shared.evictions if self.shared is not None else 0,
+            }
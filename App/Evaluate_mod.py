@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from multiprocessing import Pool, cpu_count
+
+import Autocomplete_mod
+from Autocomplete_mod import PackedNGramCounts, load_model, shard_file, stream_tokenized_sentences, sentence_log_loss, SHARDS_PER_PROCESS
+from Modelfile_mod import load_model_file
+
+# --- CONFIGURATION ---
+# Evaluation worker processes (None = one per CPU)
+EVAL_PROCESSES = None
+# ---------------------
+
+# --- 1. Held-out Perplexity ---
+#
+# The held-out file is split into byte ranges (see shard_file); every worker streams its ranges
+# through the tokenizer and adds up, per order, the log loss and the number of predictions, which
+# are merged into corpus perplexities exp(total log loss / total predictions). The model is loaded
+# and checked once before the pool starts; forked workers inherit it, others load it again
+# themselves (a memory-mapped .bin model, see Modelfile_mod.py, is shared, not copied).
+
+_model = None
+_vocabulary = None
+
+def load_any_model(filename):
+    """Loads an autocomplete model from a memory-mapped .bin file or a pickle."""
+    if filename.endswith('.bin'):
+        return load_model_file(filename)
+    return load_model(filename, with_tables=False)
+
+def load_checked_model(filename, orders=None):
+    """Loads a model for evaluation; raises ValueError if it is missing or cannot score the given orders."""
+    if not os.path.exists(filename):
+        raise ValueError(f"The model file '{filename}' was not found.")
+    model = load_any_model(filename)
+    if model is None:
+        raise ValueError(f"The model file '{filename}' could not be loaded.")
+    unsupported = [n for n in orders or () if not 2 <= n <= model.order]
+    if unsupported:
+        raise ValueError(f"The model scores orders 2..{model.order}, not {unsupported}.")
+    return model
+
+def use_model(model):
+    """Makes 'model' the one evaluate_shard scores with, in this process."""
+    global _model, _vocabulary
+    _model = model
+    _vocabulary = set(model.vocabulary)
+    counts_list = model.n_gram_counts_list
+    if isinstance(counts_list[0], PackedNGramCounts) and not isinstance(counts_list[0].word_ids, dict):
+        # Evaluation looks up most of the vocabulary many times over: a dict beats the mapped binary search
+        word_ids = {word: i for i, word in enumerate(counts_list[0].lexicon)}
+        for counts in counts_list:
+            counts.word_ids = word_ids
+
+def init_worker(model_file, tokenizer_mode):
+    Autocomplete_mod.TOKENIZER_MODE = tokenizer_mode
+    if _model is None:
+        use_model(load_any_model(model_file))
+
+def evaluate_sentences(sentences, model, vocabulary, orders, k=1.0, unknown_token="<UNK>"):
+    """Log loss and prediction count per order, plus token and OOV counts, of tokenized sentences."""
+    stats = {'sentences': 0, 'tokens': 0, 'oov': 0, 'orders': {n: [0.0, 0] for n in orders}}
+    counts_list = model.n_gram_counts_list
+    for sentence in sentences:
+        # Same <UNK> replacement as replace_oov_words_by_unk
+        tokens = [token if token in vocabulary else unknown_token for token in sentence]
+        stats['sentences'] += 1
+        stats['tokens'] += len(tokens)
+        stats['oov'] += sum(token not in vocabulary for token in sentence)
+        for n in orders:
+            log_loss, predictions = sentence_log_loss(tokens, counts_list[n-2], counts_list[n-1],
+                                                      model.vocabulary_size, n, k=k)
+            stats['orders'][n][0] += log_loss
+            stats['orders'][n][1] += predictions
+    return stats
+
+def evaluate_shard(task):
+    """Worker: evaluates one byte range of the held-out file with the worker's model."""
+    file_path, start, end, orders, k = task
+    orders = orders or range(2, _model.order + 1)
+    return evaluate_sentences(stream_tokenized_sentences(file_path, start, end), _model, _vocabulary, orders, k)
+
+def merge_stats(total, stats):
+    for key in ('sentences', 'tokens', 'oov'):
+        total[key] += stats[key]
+    for n, (log_loss, predictions) in stats['orders'].items():
+        order_total = total['orders'].setdefault(n, [0.0, 0])
+        order_total[0] += log_loss
+        order_total[1] += predictions
+    return total
+
+def evaluate_file(model_file, heldout_file, orders=None, k=1.0, processes=EVAL_PROCESSES, tokenizer_mode=None):
+    """
+    Returns the held-out perplexity report of a model: per-order perplexity, OOV rate and
+    throughput. orders defaults to every order the model can score (2..order). Raises ValueError
+    if the model is missing or cannot score the orders.
+    """
+    use_model(load_checked_model(model_file, orders))
+    processes = processes or cpu_count()
+    tokenizer_mode = tokenizer_mode or Autocomplete_mod.TOKENIZER_MODE
+    start_time = time.perf_counter()
+    tasks = [(heldout_file, start, end, orders, k)
+             for start, end in shard_file(heldout_file, processes * SHARDS_PER_PROCESS)]
+    total = {'sentences': 0, 'tokens': 0, 'oov': 0, 'orders': {}}
+    with Pool(processes, initializer=init_worker, initargs=(model_file, tokenizer_mode)) as pool:
+        for stats in pool.imap_unordered(evaluate_shard, tasks):
+            merge_stats(total, stats)
+    seconds = time.perf_counter() - start_time
+
+    return {
+        'model': model_file,
+        'heldout': heldout_file,
+        'sentences': total['sentences'],
+        'tokens': total['tokens'],
+        'oov_rate': total['oov'] / total['tokens'] if total['tokens'] else 0.0,
+        'perplexity': {n: math.exp(log_loss / predictions) if predictions else float('inf')
+                       for n, (log_loss, predictions) in sorted(total['orders'].items())},
+        'seconds': seconds,
+        'tokens_per_second': total['tokens'] / seconds if seconds else 0.0,
+        'processes': processes
+    }
+
+# --- 2. Command Line ---
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Held-out perplexity of an autocomplete model, per N-gram order.")
+    parser.add_argument("model", help="autocomplete model file (.pkl, or .bin from Modelfile_mod.py)")
+    parser.add_argument("heldout", help="held-out text file, one or more sentences per line")
+    parser.add_argument("--orders", type=int, nargs="+", help="N-gram orders to evaluate (default: 2..model order)")
+    parser.add_argument("-k", type=float, default=1.0, help="Laplace smoothing constant")
+    parser.add_argument("--processes", type=int, default=EVAL_PROCESSES, help="worker processes (default: one per CPU)")
+    parser.add_argument("--tokenizer", choices=("nltk", "fast"), help="tokenizer mode (default: TOKENIZER_MODE)")
+    parser.add_argument("--json", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.heldout):
+        print(f"Error: The file '{args.heldout}' was not found. Check path.")
+        sys.exit(1)
+
+    try:
+        report = evaluate_file(args.model, args.heldout, args.orders, args.k, args.processes, args.tokenizer)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"\n{report['sentences']} sentences, {report['tokens']} tokens, OOV rate {report['oov_rate']:.4%}")
+    for n, perplexity in report['perplexity'].items():
+        print(f"{n}-gram perplexity: {perplexity:.4f}")
+    print(f"{report['seconds']:.2f}s with {report['processes']} processes "
+          f"({report['tokens_per_second']:.0f} tokens/s)")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
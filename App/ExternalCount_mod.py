@@ -0,0 +1,168 @@
+import os
+import time
+import heapq
+import shutil
+import tempfile
+import numpy as np
+
+from Merge_mod import sum_sorted_pairs
+
+# --- CONFIGURATION ---
+# RAM cap (MB) of the in-memory counts; above it they are spilled to disk as sorted runs
+COUNT_MEMORY_MB = 1024
+# Directory for the run files (None = the system temporary directory)
+SPILL_DIR = None
+# Memory is checked every this many sentences
+MEMORY_CHECK_SENTENCES = 1000
+# Rows read from each run file at a time while merging
+MERGE_BLOCK_ROWS = 65536
+# Estimated bytes held per counted N-gram (dict slot, tuple and count) and per lexicon word
+ENTRY_BYTES = 80
+ENTRY_BYTES_PER_WORD = 8
+LEXICON_WORD_BYTES = 150
+# ---------------------
+
+# --- 1. External-Sort N-gram Counting ---
+#
+# count_n_grams keeps every distinct N-gram of the corpus in one dict per order, and most of
+# them are seen once, so a 4-gram build over a large corpus runs out of memory long before the
+# model (whose rare words are folded into <UNK>) would. This counter keeps the N-grams as tuples
+# of integer word IDs, and whenever the estimated size of its dicts passes the RAM cap it writes
+# every order out as a run: the entries sorted by their words, as a uint64 array of IDs and counts.
+# sections() then merges the runs of each order (a k-way merge holding one block per run) and
+# yields the raw counts in the count shard section format of Merge_mod.py.
+
+class ExternalNGramCounter:
+    """Counts the raw N-grams of orders 1..max_n within a memory budget, spilling sorted runs to disk."""
+    def __init__(self, max_n=4, memory_mb=COUNT_MEMORY_MB, spill_dir=SPILL_DIR, start_token='<s>', end_token='</s>'):
+        self.max_n = max_n
+        self.memory_bytes = memory_mb * 1024 * 1024
+        self.start_token = start_token
+        self.end_token = end_token
+        self.lexicon = []
+        self.word_ids = {}
+        self.counts = [{} for _ in range(max_n)]
+        self.workdir = tempfile.mkdtemp(prefix="ngram-runs-", dir=spill_dir)
+        # Run files of every order
+        self.runs = [[] for _ in range(max_n)]
+        self.sentences = 0
+        self.spills = 0
+        self.spill_bytes = 0
+        self.spill_seconds = 0.0
+        self.merge_seconds = 0.0
+        self.peak_bytes = 0
+        self.start_id = self.word_id(start_token)
+
+    def word_id(self, word):
+        i = self.word_ids.get(word)
+        if i is None:
+            i = self.word_ids[word] = len(self.lexicon)
+            self.lexicon.append(word)
+        return i
+
+    def estimated_bytes(self):
+        return (sum(len(counts) * (ENTRY_BYTES + ENTRY_BYTES_PER_WORD * n) for n, counts in enumerate(self.counts, start=1))
+                + len(self.lexicon) * LEXICON_WORD_BYTES)
+
+    def add_sentences(self, sentences):
+        """Counts tokenized sentences like count_all_n_grams, spilling whenever the RAM cap is reached."""
+        end_id = self.word_id(self.end_token)
+        for sentence in sentences:
+            ids = [self.word_id(token) for token in sentence]
+            for n in range(1, self.max_n + 1):
+                n_gram_counts = self.counts[n-1]
+                padded = [self.start_id] * (n - 1) + ids + [end_id]
+                for i in range(len(padded) - n + 1):
+                    n_gram = tuple(padded[i:i+n])
+                    n_gram_counts[n_gram] = n_gram_counts.get(n_gram, 0) + 1
+            self.sentences += 1
+            if self.sentences % MEMORY_CHECK_SENTENCES == 0:
+                size = self.estimated_bytes()
+                self.peak_bytes = max(self.peak_bytes, size)
+                if size > self.memory_bytes:
+                    self.spill()
+
+    def spill(self):
+        """Writes every order's counts to a new sorted run file and empties them."""
+        start = time.perf_counter()
+        lexicon = self.lexicon
+        for n, n_gram_counts in enumerate(self.counts, start=1):
+            if not n_gram_counts:
+                continue
+            # Sorted by the words themselves, so that runs (and shards) of any lexicon merge alike
+            entries = sorted(n_gram_counts.items(), key=lambda item: [lexicon[i] for i in item[0]])
+            rows = np.array([n_gram + (count,) for n_gram, count in entries], dtype=np.uint64)
+            filename = os.path.join(self.workdir, f"run-{n}-{len(self.runs[n-1])}.npy")
+            np.save(filename, rows)
+            self.runs[n-1].append(filename)
+            self.spill_bytes += os.path.getsize(filename)
+            n_gram_counts.clear()
+        self.spills += 1
+        self.spill_seconds += time.perf_counter() - start
+
+    def read_run(self, filename):
+        """Yields the (n_gram, count) entries of a run file, one block of rows in memory at a time."""
+        rows = np.load(filename, mmap_mode='r')
+        lexicon = self.lexicon
+        for lo in range(0, len(rows), MERGE_BLOCK_ROWS):
+            for row in rows[lo:lo + MERGE_BLOCK_ROWS].tolist():
+                yield tuple(lexicon[i] for i in row[:-1]), row[-1]
+
+    def sections(self):
+        """
+        Yields (n, pairs) for n = 1..max_n: the raw N-gram counts merged from the runs and what is
+        still in memory, sorted by N-gram (see Merge_mod.py); each stream is only valid until the next.
+        """
+        if self.spills:
+            # The rest goes to disk too, so that the merge only holds one block per run
+            self.spill()
+        lexicon = self.lexicon
+        for n in range(1, self.max_n + 1):
+            # Without a spill the counts never left memory, and sorting them is all the merge there is
+            in_memory = sorted((tuple(lexicon[i] for i in n_gram), count) for n_gram, count in self.counts[n-1].items())
+            self.counts[n-1].clear()
+            streams = [self.read_run(filename) for filename in self.runs[n-1]] + [iter(in_memory)]
+            yield n, self.timed(sum_sorted_pairs(heapq.merge(*streams)))
+
+    def timed(self, pairs):
+        """Passes pairs through, adding the time spent producing them to merge_seconds."""
+        pairs = iter(pairs)
+        while True:
+            start = time.perf_counter()
+            try:
+                pair = next(pairs)
+            except StopIteration:
+                self.merge_seconds += time.perf_counter() - start
+                return
+            self.merge_seconds += time.perf_counter() - start
+            yield pair
+
+    def stats(self):
+        """Spill volume and timings, for sizing COUNT_MEMORY_MB."""
+        return {
+            'sentences': self.sentences,
+            'memory_cap_bytes': self.memory_bytes,
+            'peak_estimated_bytes': self.peak_bytes,
+            'spills': self.spills,
+            'runs': sum(len(runs) for runs in self.runs),
+            'spill_bytes': self.spill_bytes,
+            'spill_seconds': self.spill_seconds,
+            'merge_seconds': self.merge_seconds,
+        }
+
+    def close(self):
+        """Deletes the run files."""
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def print_spill_report(stats):
+    print(f"Counted {stats['sentences']} sentences, peak ~{stats['peak_estimated_bytes'] / 2**20:.1f} MB "
+          f"of {stats['memory_cap_bytes'] / 2**20:.0f} MB")
+    print(f"Spilled {stats['spills']} times: {stats['runs']} runs, {stats['spill_bytes'] / 2**20:.1f} MB "
+          f"in {stats['spill_seconds']:.2f}s; merge time {stats['merge_seconds']:.2f}s")
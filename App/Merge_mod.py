@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import heapq
+import pickle
+import argparse
+
+from Autocorrect_mod import stream_words, get_count, get_probs, build_delete_index, save_model_autocorrect
+from Autocomplete_mod import (count_raw_n_grams_parallel, replace_oov_in_n_gram_counts, build_suggestion_tables,
+                              NGramModel, save_model, TRAIN_PROCESSES)
+
+# --- CONFIGURATION ---
+# (key, count) pairs per pickled chunk of a count shard: the memory one open shard needs while merging
+SHARD_CHUNK_SIZE = 50000
+SHARD_FORMAT_VERSION = 1
+# ---------------------
+
+# --- 1. Count Shards ---
+#
+# A count shard holds the raw counts of one training run, before any vocabulary threshold: the
+# autocorrect word counts (section 'words') and the autocomplete N-gram counts before <UNK>
+# replacement (sections 1..max_n). Shards of separately trained corpora (per month, per customer
+# corpus) merge into one, and the thresholds are applied to the merged counts only.
+#
+# The file is a header followed by one run per section: the section name, pickled chunks of its
+# pairs sorted by key, and None; a final None closes the file. Sorted runs merge with a streaming
+# k-way merge, holding one chunk per shard in memory.
+
+def section_order(name):
+    """Sections are stored 'words' first, then the N-gram orders ascending."""
+    return (0, 0) if name == 'words' else (1, name)
+
+def sorted_pairs(counts):
+    """(key, count) pairs of a counts dict in key order. Only the keys are sorted, one section at a time."""
+    for key in sorted(counts):
+        yield key, counts[key]
+
+def write_count_shard(filename, sections, meta=None):
+    """
+    Writes a count shard; returns the number of entries written. sections is a {name: counts}
+    dict, where counts is a {key: count} dict, or an iterable of (name, pairs) in storage order
+    with every pairs sorted by key (as merge_count_shards yields them).
+    """
+    if isinstance(sections, dict):
+        sections = [(name, sorted_pairs(counts) if isinstance(counts, dict) else counts)
+                    for name, counts in sorted(sections.items(), key=lambda item: section_order(item[0]))]
+    entries = 0
+    tmp = filename + '.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            pickle.dump({'format_version': SHARD_FORMAT_VERSION, **(meta or {})}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            for name, pairs in sections:
+                pickle.dump(name, f, protocol=pickle.HIGHEST_PROTOCOL)
+                chunk = []
+                for pair in pairs:
+                    chunk.append(pair)
+                    if len(chunk) == SHARD_CHUNK_SIZE:
+                        pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+                        entries += len(chunk)
+                        chunk = []
+                if chunk:
+                    pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    entries += len(chunk)
+                pickle.dump(None, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(None, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        # Never leave half a shard behind, e.g. when a merge fails
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, filename)
+    return entries
+
+def read_count_shard_header(f):
+    header = pickle.load(f)
+    if not isinstance(header, dict) or header.get('format_version') != SHARD_FORMAT_VERSION:
+        raise ValueError(f"{getattr(f, 'name', 'file')} is not a count shard (format version {SHARD_FORMAT_VERSION})")
+    return header
+
+def read_section(f):
+    """Yields the (key, count) pairs of the section the file is positioned in, leaving it at the next name."""
+    while True:
+        chunk = pickle.load(f)
+        if chunk is None:
+            return
+        yield from chunk
+
+def sum_sorted_pairs(pairs):
+    """Adds up the counts of equal keys in a key-sorted stream of (key, count) pairs."""
+    key = count = None
+    for k, c in pairs:
+        if k == key:
+            count += c
+            continue
+        if key is not None:
+            yield key, count
+        key, count = k, c
+    if key is not None:
+        yield key, count
+
+def merge_count_shards(filenames):
+    """
+    Yields (section name, merged pairs) for the sections of the shards, in storage order. The
+    shards are read front to back in lockstep: a pairs stream is only valid until the next section.
+    """
+    files = [open(filename, 'rb') for filename in filenames]
+    try:
+        for f in files:
+            read_count_shard_header(f)
+        # The name of the section every shard is positioned at (None at the end)
+        next_names = [pickle.load(f) for f in files]
+        while any(next_name is not None for next_name in next_names):
+            name = min((name for name in next_names if name is not None), key=section_order)
+            missing = [filenames[i] for i, next_name in enumerate(next_names) if next_name != name]
+            if missing:
+                # A merged section would only count part of the corpus
+                raise ValueError(f"Count shards {', '.join(missing)} hold no section {name!r}; "
+                                 "merged shards must be counted with the same sections")
+            pairs = sum_sorted_pairs(heapq.merge(*(read_section(f) for f in files)))
+            yield name, pairs
+            # Skip what the caller left unread, to reach the next section names
+            for _ in pairs:
+                pass
+            next_names = [pickle.load(f) for f in files]
+    finally:
+        for f in files:
+            f.close()
+
+def count_corpus(file_path, max_n=4, processes=TRAIN_PROCESSES, words=True, n_grams=True):
+    """The count shard sections of a corpus file: its autocorrect word counts and raw N-gram counts."""
+    sections = {}
+    if words:
+        sections['words'] = dict(get_count(stream_words(file_path)))
+    if n_grams:
+        for n, n_gram_counts in enumerate(count_raw_n_grams_parallel(file_path, max_n, processes), start=1):
+            sections[n] = n_gram_counts
+    return sections
+
+# --- 2. Building Models From Merged Counts ---
+
+def threshold_n_gram_sections(sections, count_threshold, end_token='</s>'):
+    """
+    Returns (vocabulary, n_gram_counts_list) from a stream of raw N-gram count sections 1..max_n:
+    the words counted at least count_threshold times, and the counts with every other word
+    replaced by <UNK>, as apply_count_threshold gives for the raw counts held in memory.
+    """
+    vocabulary, n_gram_counts_list = None, []
+    for name, pairs in sections:
+        if name != len(n_gram_counts_list) + 1:
+            raise ValueError(f"Count sections hold no {len(n_gram_counts_list) + 1}-gram counts")
+        if name == 1:
+            raw_unigram_counts = dict(pairs)
+            # Unigram counts are the word counts plus one end token per sentence
+            vocabulary = [n_gram[0] for n_gram, count in raw_unigram_counts.items()
+                          if count >= count_threshold and n_gram[0] != end_token]
+            pairs = raw_unigram_counts.items()
+        n_gram_counts_list.append(replace_oov_in_n_gram_counts(pairs, vocabulary))
+    return vocabulary, n_gram_counts_list
+
+def build_models_from_counts(sections, count_threshold, autocorrect_file=None, autocomplete_file=None,
+                             end_token='</s>'):
+    """
+    Builds and saves the autocorrect and/or autocomplete model from a stream of count shard
+    sections (see merge_count_shards), the vocabulary threshold applied to the merged counts.
+    Only the finished models are held in memory. Returns (autocorrect vocab size, NGramModel or None).
+    """
+    vocab_size, model = None, None
+
+    def n_gram_sections():
+        nonlocal vocab_size
+        for name, pairs in sections:
+            if name != 'words':
+                yield name, pairs
+            elif autocorrect_file is not None:
+                word_counts = dict(pairs)
+                vocab = set(word_counts)
+                save_model_autocorrect(vocab, get_probs(word_counts), autocorrect_file,
+                                       delete_index=build_delete_index(vocab), counts=word_counts)
+                vocab_size = len(vocab)
+
+    if autocomplete_file is None:
+        for _ in n_gram_sections():
+            pass
+        return vocab_size, model
+    vocabulary, n_gram_counts_list = threshold_n_gram_sections(n_gram_sections(), count_threshold, end_token)
+    if n_gram_counts_list:
+        model = NGramModel(vocabulary, n_gram_counts_list, tables=build_suggestion_tables(vocabulary, n_gram_counts_list))
+        save_model(model, autocomplete_file)
+    return vocab_size, model
+
+# --- 3. Command Line ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count shards: count a corpus, merge shards, build the models from them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    count = commands.add_parser("count", help="count a corpus into a shard")
+    count.add_argument("corpus", help="text file, one or more sentences per line")
+    count.add_argument("-o", "--output", required=True, help="count shard to write")
+    count.add_argument("--max-n", type=int, default=4, help="highest N-gram order")
+    count.add_argument("--processes", type=int, default=TRAIN_PROCESSES, help="worker processes (default: one per CPU)")
+    merge = commands.add_parser("merge", help="merge shards and/or build the models from them")
+    merge.add_argument("shards", nargs="+", help="count shards to merge")
+    merge.add_argument("-o", "--output", help="merged count shard to write")
+    merge.add_argument("--autocorrect", help="autocorrect model pickle to build from the merged counts")
+    merge.add_argument("--autocomplete", help="autocomplete model pickle to build from the merged counts")
+    merge.add_argument("--count-threshold", type=int, default=2, help="minimum count of an autocomplete word")
+    args = parser.parse_args(argv)
+
+    st = time.time()
+    if args.command == "count":
+        if not os.path.exists(args.corpus):
+            print(f"Error: The file '{args.corpus}' was not found. Check path.")
+            sys.exit(1)
+        entries = write_count_shard(args.output, count_corpus(args.corpus, args.max_n, args.processes),
+                                    meta={'source': os.path.basename(args.corpus), 'max_n': args.max_n})
+        print(f"Counted {args.corpus} into {args.output}: {entries} entries in {time.time() - st:.2f}s")
+        return
+
+    if not (args.output or args.autocorrect or args.autocomplete):
+        parser.error("merge needs --output, --autocorrect or --autocomplete")
+    shards = args.shards
+    if args.output:
+        entries = write_count_shard(args.output, merge_count_shards(shards),
+                                    meta={'sources': [os.path.basename(shard) for shard in shards]})
+        print(f"Merged {len(shards)} shards into {args.output}: {entries} entries in {time.time() - st:.2f}s")
+        # The models are built from the merged shard, one stream instead of k
+        shards = [args.output]
+    if args.autocorrect or args.autocomplete:
+        vocab_size, model = build_models_from_counts(merge_count_shards(shards), args.count_threshold,
+                                                     args.autocorrect, args.autocomplete)
+        if vocab_size is not None:
+            print(f"Autocorrect vocab size: {vocab_size}")
+        if model is not None:
+            print(f"Autocomplete vocabulary size: {len(model.vocabulary)} (order {model.order})")
+        print(f"Total time: {time.time() - st:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
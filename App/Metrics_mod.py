@@ -0,0 +1,155 @@
+import time
+import bisect
+import threading
+
+# --- CONFIGURATION ---
+# Histogram bucket upper bounds in seconds (+Inf is implicit)
+REQUEST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Bucket upper bounds of the candidate strings one autocorrect call checks
+CANDIDATE_BUCKETS = (1, 10, 30, 100, 300, 1000, 3000, 10000, 30000, 100000, 300000)
+# Set to False to skip recording stage timings altogether
+STAGE_METRICS = True
+# ---------------------
+
+# --- 1. Metric Types ---
+#
+# A minimal in-process implementation of Prometheus counters and histograms, rendered in the
+# text exposition format. Metrics are per process: with several workers, Prometheus scrapes each.
+
+def format_labels(labelnames, labels, extra=()):
+    pairs = list(zip(labelnames, labels)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def format_value(value):
+    return "+Inf" if value == float('inf') else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name + format_labels(self.labelnames, key), value) for key, value in sorted(self.values.items())]
+
+
+class Histogram:
+    """Histogram of observed values (seconds, or counts) with cumulative buckets, like prometheus_client's."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        # labels -> [per-bucket counts (not cumulative), sum]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0]
+            entry[0][i] += 1
+            entry[1] += value
+
+    def totals(self, **labels):
+        """(number of observations, sum of the values) so far for the given labels."""
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            entry = self.values.get(key)
+            return (sum(entry[0]), entry[1]) if entry is not None else (0, 0.0)
+
+    def samples(self):
+        lines = []
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append((self.name + "_bucket" + format_labels(self.labelnames, key, [("le", format_value(bound))]),
+                                  cumulative))
+                lines.append((self.name + "_sum" + format_labels(self.labelnames, key), total))
+                lines.append((self.name + "_count" + format_labels(self.labelnames, key), cumulative))
+        return lines
+
+
+class Registry:
+    """The metrics exposed by one /metrics endpoint."""
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name} {format_value(value)}" for name, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- 2. Application Metrics ---
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "typing_request_duration_seconds", "Request latency by route.", ("route",), REQUEST_BUCKETS))
+REQUESTS = REGISTRY.register(Counter(
+    "typing_requests_total", "Requests by route and HTTP status.", ("route", "status")))
+EMPTY_RESULTS = REGISTRY.register(Counter(
+    "typing_empty_results_total", "Requests that returned no suggestions, by route.", ("route",)))
+ERRORS = REGISTRY.register(Counter(
+    "typing_errors_total", "Requests that failed with a server error, by route.", ("route",)))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "typing_stage_duration_seconds", "Time spent in each internal stage of one call.", ("stage",), STAGE_BUCKETS))
+AUTOCORRECT_CANDIDATES = REGISTRY.register(Histogram(
+    "typing_autocorrect_candidates", "Candidate strings checked by one autocorrect call, by search engine.",
+    ("engine",), CANDIDATE_BUCKETS))
+
+
+class StageTimer:
+    """
+    Splits the time of one call into named stages: lap(stage) charges the time since the
+    previous lap (or since creation) to stage, record() observes every stage's total once.
+    """
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.stages = {}
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def record(self):
+        if STAGE_METRICS:
+            for stage, seconds in self.stages.items():
+                STAGE_SECONDS.observe(seconds, stage=f"{self.prefix}.{stage}")
@@ -0,0 +1,376 @@
+import os
+import sys
+import json
+import mmap
+import time
+import random
+import struct
+import argparse
+import numpy as np
+
+from Autocorrect_mod import load_model_autocorrect
+from Autocomplete_mod import NGramModel, PackedNGramCounts, PackedContinuationTable, load_model, build_backoff_weights
+
+# --- CONFIGURATION ---
+# Every model file starts with this magic, then the format version and the header length.
+MAGIC = b"TSMODEL\0"
+FILE_FORMAT_VERSION = 1
+# Arrays start on this boundary so the memory-mapped views stay aligned.
+ALIGNMENT = 64
+# ---------------------
+
+# --- 1. File Layout ---
+#
+# MAGIC | uint32 format version | uint32 header length | JSON header | arrays...
+# The header holds the model kind, its metadata and, for every array, its dtype, shape and
+# byte offset. Arrays are stored raw, so a reader maps the file once and wraps each array
+# with np.frombuffer: nothing is copied, and all processes share the page cache.
+
+def write_model_file(filename, kind, meta, arrays):
+    """Writes a model file holding the given metadata and {name: np.ndarray} arrays."""
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        layout[name] = [array.dtype.str, list(array.shape), offset]
+        offset += array.nbytes
+    header = json.dumps({'kind': kind, 'meta': meta, 'arrays': layout}).encode('utf-8')
+    # Array offsets are relative to the end of the (padded) header
+    start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    with open(filename, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<II', FILE_FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(start + layout[name][2])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(start + offset)
+    print(f"\nModel file successfully written to {filename} ({start + offset} bytes)")
+
+def open_model_file(filename):
+    """Memory-maps a model file and returns (kind, meta, {name: read-only np.ndarray view})."""
+    with open(filename, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{filename} is not a model file")
+    version, header_len = struct.unpack_from('<II', mm, len(MAGIC))
+    if version != FILE_FORMAT_VERSION:
+        raise ValueError(f"{filename} has format version {version}, expected {FILE_FORMAT_VERSION}")
+    header_start = len(MAGIC) + 8
+    header = json.loads(mm[header_start:header_start + header_len].decode('utf-8'))
+    start = -(-(header_start + header_len) // ALIGNMENT) * ALIGNMENT
+
+    arrays = {}
+    for name, (dtype, shape, offset) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape)) if shape else 1
+        arrays[name] = np.frombuffer(mm, dtype=dtype, count=count, offset=start + offset).reshape(shape)
+    return header['kind'], header['meta'], arrays
+
+# --- 2. String Tables ---
+
+def encode_strings(strings):
+    """Encodes strings as one UTF-8 blob (uint8) and the offsets of each string in it (uint64, len + 1)."""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+class StringTable:
+    """
+    Sequence of strings kept as a UTF-8 blob plus offsets (usually views on a mapped file).
+    sorted_ids lists the indices in string order for get(); it is None if the table is sorted.
+    get() makes the table a stand-in for a {word: id} dict.
+    """
+    def __init__(self, blob, offsets, sorted_ids=None):
+        self.blob = blob
+        self.offsets = offsets
+        self.sorted_ids = sorted_ids
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, i):
+        return self.blob[int(self.offsets[i]):int(self.offsets[i+1])].tobytes()
+
+    def __getitem__(self, i):
+        return self.raw(i).decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def get(self, word, default=None):
+        """Returns the index of 'word' by binary search (UTF-8 byte order is code point order)."""
+        key = word.encode('utf-8')
+        ids = self.sorted_ids
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.raw(mid if ids is None else int(ids[mid])) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self):
+            i = lo if ids is None else int(ids[lo])
+            if self.raw(i) == key:
+                return i
+        return default
+
+    def __contains__(self, word):
+        return self.get(word) is not None
+
+class IdSequence:
+    """Sequence of strings given as IDs into a StringTable, e.g. a ranking of the vocabulary."""
+    def __init__(self, ids, table):
+        self.ids = ids
+        self.table = table
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        return self.table[int(self.ids[i])]
+
+    def __iter__(self):
+        return (self.table[int(i)] for i in self.ids)
+
+class StringMultiMap:
+    """Read-only {string: [strings]} map: sorted keys, and per key a slice of IDs into a value table."""
+    def __init__(self, keys, value_offsets, value_ids, values):
+        self.keys = keys
+        self.value_offsets = value_offsets
+        self.value_ids = value_ids
+        self.values = values
+
+    def get(self, key, default=None):
+        i = self.keys.get(key)
+        if i is None:
+            return default
+        lo, hi = int(self.value_offsets[i]), int(self.value_offsets[i+1])
+        return [self.values[int(j)] for j in self.value_ids[lo:hi]]
+
+def encode_multimap(mapping, word_ids):
+    """Encodes a {string: [words]} dict for StringMultiMap: keys blob/offsets, value offsets and value IDs."""
+    keys = sorted(mapping)
+    key_blob, key_offsets = encode_strings(keys)
+    value_offsets = np.zeros(len(keys) + 1, dtype=np.uint64)
+    np.cumsum([len(mapping[k]) for k in keys], out=value_offsets[1:])
+    value_ids = np.fromiter((word_ids[w] for k in keys for w in mapping[k]), dtype=np.uint32, count=int(value_offsets[-1]))
+    return key_blob, key_offsets, value_offsets, value_ids
+
+def encode_table(strings):
+    """Encodes a string table for StringTable: blob, offsets and the IDs in string order."""
+    blob, offsets = encode_strings(strings)
+    sorted_ids = np.array(sorted(range(len(strings)), key=strings.__getitem__), dtype=np.uint32)
+    return blob, offsets, sorted_ids
+
+# --- 3. Autocorrect Model Files ---
+
+def save_model_autocorrect_file(vocab, probs, delete_index, filename):
+    """Writes vocab, probs and the delete index to a memory-mappable model file."""
+    words = sorted(vocab)
+    word_ids = {w: i for i, w in enumerate(words)}
+    blob, offsets = encode_strings(words)
+    key_blob, key_offsets, value_offsets, value_ids = encode_multimap(delete_index, word_ids)
+    arrays = {
+        'vocab_blob': blob,
+        'vocab_offsets': offsets,
+        'probs': np.array([probs.get(w, 0) for w in words], dtype=np.float64),
+        'deletes_blob': key_blob,
+        'deletes_offsets': key_offsets,
+        'deletes_value_offsets': value_offsets,
+        'deletes_value_ids': value_ids
+    }
+    write_model_file(filename, 'autocorrect', {'vocab_size': len(words)}, arrays)
+
+class MappedProbs:
+    """Read-only {word: probability} map over a vocabulary StringTable and a parallel float array."""
+    def __init__(self, vocab, probs):
+        self.vocab = vocab
+        self.probs = probs
+
+    def get(self, word, default=None):
+        i = self.vocab.get(word)
+        return default if i is None else float(self.probs[i])
+
+    def __getitem__(self, word):
+        i = self.vocab.get(word)
+        if i is None:
+            raise KeyError(word)
+        return float(self.probs[i])
+
+    def __len__(self):
+        return len(self.probs)
+
+def load_model_autocorrect_file(filename):
+    """
+    Maps an autocorrect model file and returns (vocab, probs, delete_index), the same triple as
+    load_model_autocorrect(with_index=True), served in place from the file.
+    """
+    kind, meta, arrays = open_model_file(filename)
+    if kind != 'autocorrect':
+        raise ValueError(f"{filename} holds a {kind} model, not an autocorrect model")
+    # The vocabulary is written sorted, so it needs no separate sort order
+    vocab = StringTable(arrays['vocab_blob'], arrays['vocab_offsets'])
+    probs = MappedProbs(vocab, arrays['probs'])
+    delete_index = StringMultiMap(StringTable(arrays['deletes_blob'], arrays['deletes_offsets']),
+                                  arrays['deletes_value_offsets'], arrays['deletes_value_ids'], vocab)
+    print(f"\nAutocorrect model file successfully mapped from {filename}")
+    return vocab, probs, delete_index
+
+# --- 4. Autocomplete Model Files ---
+
+def save_model_file(model, filename):
+    """Writes a packed NGramModel (see load_model(packed=True)) with its tables to a memory-mappable file."""
+    counts_list = model.n_gram_counts_list
+    lexicon, word_ids = counts_list[0].lexicon, counts_list[0].word_ids
+    blob, offsets, sorted_ids = encode_table(lexicon)
+    arrays = {
+        'lexicon_blob': blob,
+        'lexicon_offsets': offsets,
+        'lexicon_sorted': sorted_ids
+    }
+    for counts in counts_list:
+        arrays[f'ngram{counts.n}_contexts'] = counts.contexts
+        arrays[f'ngram{counts.n}_words'] = counts.words
+        arrays[f'ngram{counts.n}_counts'] = counts.counts
+        arrays[f'ngram{counts.n}_by_count'] = counts.by_count
+
+    tables = model.tables
+    prefix_index = tables['prefix_index']
+    arrays['unigram_ranking'] = np.array([word_ids[w] for w in tables['unigram_ranking']], dtype=np.uint32)
+    arrays['prefix_words'] = np.array([word_ids[w] for w in prefix_index['words']], dtype=np.uint32)
+    arrays['prefix_ranks'] = np.asarray(prefix_index['ranks'], dtype=np.uint32)
+    (arrays['prefix_top_blob'], arrays['prefix_top_offsets'],
+     arrays['prefix_top_value_offsets'], arrays['prefix_top_value_ids']) = encode_multimap(prefix_index['top'], word_ids)
+
+    meta = {
+        'version': model.version,
+        'order': model.order,
+        'vocabulary_length': len(model.vocabulary),
+        'totals': model.totals,
+        'prefix_cache_size': prefix_index['cache_size'],
+        'backoff_weights': tables['backoff_weights']
+    }
+    write_model_file(filename, 'autocomplete', meta, arrays)
+
+def load_model_file(filename):
+    """Maps an autocomplete model file and returns an NGramModel whose counts and tables are served in place."""
+    kind, meta, arrays = open_model_file(filename)
+    if kind != 'autocomplete':
+        raise ValueError(f"{filename} holds a {kind} model, not an autocomplete model")
+    lexicon = StringTable(arrays['lexicon_blob'], arrays['lexicon_offsets'], arrays['lexicon_sorted'])
+    # Vocabulary words hold the first IDs of the lexicon (see build_lexicon), in vocabulary order:
+    # their string order is the lexicon's with the special tokens and other words left out
+    vocabulary_length = meta['vocabulary_length']
+    lexicon_sorted = arrays['lexicon_sorted']
+    vocabulary = StringTable(arrays['lexicon_blob'], arrays['lexicon_offsets'][:vocabulary_length + 1],
+                             lexicon_sorted[lexicon_sorted < vocabulary_length])
+
+    counts_list = []
+    for n in range(1, meta['order'] + 1):
+        counts_list.append(PackedNGramCounts(n, lexicon, lexicon,
+                                             arrays[f'ngram{n}_contexts'], arrays[f'ngram{n}_words'],
+                                             arrays[f'ngram{n}_counts'], arrays[f'ngram{n}_by_count']))
+    tables = {
+        'continuations': [PackedContinuationTable(counts_list[i], counts_list[i+1]) for i in range(len(counts_list) - 1)],
+        'unigram_ranking': IdSequence(arrays['unigram_ranking'], lexicon),
+        'prefix_index': {
+            'words': IdSequence(arrays['prefix_words'], lexicon),
+            'ranks': arrays['prefix_ranks'],
+            'top': StringMultiMap(StringTable(arrays['prefix_top_blob'], arrays['prefix_top_offsets']),
+                                  arrays['prefix_top_value_offsets'], arrays['prefix_top_value_ids'], lexicon),
+            'cache_size': meta['prefix_cache_size']
+        },
+        'backoff_weights': meta.get('backoff_weights') or build_backoff_weights(meta['order'])
+    }
+    print(f"\nAutocomplete model file successfully mapped from {filename}")
+    return NGramModel(vocabulary, counts_list, tables=tables, version=meta['version'], totals=meta['totals'])
+
+# --- 5. Converter ---
+
+def convert_model(kind, source, target):
+    """Converts a .pkl model written by save_model_autocorrect/save_model into a model file."""
+    st = time.time()
+    if kind == 'autocorrect':
+        vocab, probs, delete_index = load_model_autocorrect(source, with_index=True)
+        if vocab is None:
+            return False
+        save_model_autocorrect_file(vocab, probs, delete_index, target)
+    else:
+        model = load_model(source, packed=True)
+        if model is None:
+            return False
+        save_model_file(model, target)
+    print(f"Conversion time: {time.time()-st:.4f}s")
+    return True
+
+def check_model_file(kind, source, target, samples=1000, seed=0):
+    """
+    Compares a model file with the pickle it was converted from on a random sample: vocabulary
+    membership (of words and non-words), probabilities and delete index lists for autocorrect,
+    N-gram counts and continuation lists for autocomplete. Returns the mismatches found.
+    """
+    rng = random.Random(seed)
+    mismatches = []
+
+    def compare(what, expected, actual):
+        if expected != actual:
+            mismatches.append(f"{what}: expected {expected!r}, got {actual!r}")
+
+    if kind == 'autocorrect':
+        vocab, probs, delete_index = load_model_autocorrect(source, with_index=True)
+        mapped_vocab, mapped_probs, mapped_index = load_model_autocorrect_file(target)
+        words = rng.sample(sorted(vocab), min(samples, len(vocab)))
+        compare("vocab size", len(vocab), len(mapped_vocab))
+        for w in words:
+            compare(f"{w!r} in vocab", True, w in mapped_vocab)
+            compare(f"{w + '#'!r} in vocab", w + '#' in vocab, w + '#' in mapped_vocab)
+            compare(f"probs[{w!r}]", probs.get(w, 0), mapped_probs.get(w, 0))
+        for key in rng.sample(sorted(delete_index), min(samples, len(delete_index))):
+            compare(f"delete_index[{key!r}]", sorted(delete_index[key]), sorted(mapped_index.get(key, [])))
+        return mismatches
+
+    model = load_model(source, packed=False)
+    mapped = load_model_file(target)
+    vocabulary = set(model.vocabulary)
+    compare("vocabulary", list(model.vocabulary), list(mapped.vocabulary))
+    for w in rng.sample(model.vocabulary, min(samples, len(vocabulary))):
+        compare(f"{w!r} in vocabulary", True, w in mapped.vocabulary)
+        compare(f"{w + '#'!r} in vocabulary", w + '#' in vocabulary, w + '#' in mapped.vocabulary)
+    for special in ('<s>', '</s>', '<UNK>'):
+        compare(f"{special!r} in vocabulary", special in vocabulary, special in mapped.vocabulary)
+    for n, (counts, mapped_counts) in enumerate(zip(model.n_gram_counts_list, mapped.n_gram_counts_list), start=1):
+        for n_gram in rng.sample(list(counts), min(samples, len(counts))):
+            compare(f"count{n_gram}", counts[n_gram], mapped_counts.get(n_gram, 0))
+    # Ties are in vocabulary order; words outside the vocabulary (the special tokens) may tie in any order
+    position = {w: i for i, w in enumerate(model.vocabulary)}
+    tie_order = lambda wc: (-wc[1], position.get(wc[0], len(position)), wc[0])
+    for table, mapped_table in zip(model.tables['continuations'], mapped.tables['continuations']):
+        for context in rng.sample(list(table), min(samples, len(table))):
+            count, continuations = table[context]
+            mapped_count, mapped_continuations = mapped_table.get(context, (0, []))
+            compare(f"continuations{context}", (count, sorted(continuations, key=tie_order)),
+                    (mapped_count, sorted(mapped_continuations, key=tie_order)))
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a pickled model into a memory-mapped model file.")
+    parser.add_argument("kind", choices=["autocorrect", "autocomplete"])
+    parser.add_argument("source", help="Path of the .pkl model")
+    parser.add_argument("target", help="Path of the model file to write")
+    parser.add_argument("--check", action="store_true", help="compare the written file with the pickle afterwards")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"Error: Model file {args.source} not found.")
+        sys.exit(1)
+    if not convert_model(args.kind, args.source, args.target):
+        sys.exit(1)
+    if args.check:
+        mismatches = check_model_file(args.kind, args.source, args.target)
+        for mismatch in mismatches[:10]:
+            print(f"  {mismatch}")
+        print(f"Check: {len(mismatches)} mismatches between {args.source} and {args.target}")
+        sys.exit(1 if mismatches else 0)
@@ -0,0 +1,267 @@
+import os
+import re
+import time
+import pickle
+import threading
+
+from Autocorrect_mod import CountProbs, add_to_delete_index, build_delete_index
+from Autocomplete_mod import (PackedNGramCounts, tokenize_data, build_unigram_ranking, build_prefix_index,
+                              save_model)
+
+# --- CONFIGURATION ---
+# Online occurrences after which an unknown word joins the vocabulary (the training count_threshold)
+ONLINE_WORD_THRESHOLD = 2
+# Sentences folded in between two rebuilds of the unigram ranking and prefix index (new words always rebuild)
+RANKING_REFRESH_SENTENCES = 1000
+# Seconds between two snapshots of an updated model (None = only on request)
+SNAPSHOT_SECONDS = 300
+# ---------------------
+
+# --- 1. Incremental Model Updates ---
+#
+# Accepted user text is folded into the live models without retraining. Only what the new text
+# touches is recomputed: the counts of its words and N-grams, the continuation lists of the
+# contexts it extends, and (through CountProbs) the probabilities of its words. Every structure is
+# replaced or grown in place with single assignments, so requests can keep reading the models
+# while an update runs. Memory-mapped and packed models are read-only: load the pickles unpacked.
+
+class OnlineAutocorrect:
+    """Updatable autocorrect model: vocab set, CountProbs and delete index."""
+    def __init__(self, vocab, probs, delete_index=None, word_threshold=ONLINE_WORD_THRESHOLD):
+        if not isinstance(vocab, set) or not isinstance(probs, (dict, CountProbs)):
+            raise ValueError("Online updates need the autocorrect model loaded from its pickle.")
+        if not isinstance(probs, CountProbs):
+            # Probabilities alone cannot be turned back into the counts that new words are added to
+            raise ValueError("The autocorrect model has no word counts (it predates online updates): retrain it.")
+        self.vocab = vocab
+        self.probs = probs
+        self.delete_index = delete_index if delete_index is not None else build_delete_index(vocab)
+        self.word_threshold = word_threshold
+
+    def add_words(self, words):
+        """Counts the words; returns the ones that joined the vocabulary."""
+        self.probs.add(words)
+        new_words = {w for w in words if w not in self.vocab and self.probs.counts[w] >= self.word_threshold}
+        if new_words:
+            add_to_delete_index(self.delete_index, new_words)
+            self.vocab.update(new_words)
+        return sorted(new_words)
+
+    def save(self, filename):
+        write_atomically(filename, {'vocab': self.vocab, 'probs': self.probs.to_dict(),
+                                    'delete_index': self.delete_index, 'counts': self.probs.counts})
+
+
+class OnlineAutocomplete:
+    """Updatable autocomplete model: an NGramModel with dict counts and (optionally) its suggestion tables."""
+    def __init__(self, model, word_threshold=ONLINE_WORD_THRESHOLD, unknown_token="<UNK>",
+                 start_token='<s>', end_token='</s>'):
+        if any(isinstance(counts, PackedNGramCounts) for counts in model.n_gram_counts_list):
+            raise ValueError("Online updates need the autocomplete model loaded with packed=False.")
+        self.model = model
+        self.word_threshold = word_threshold
+        self.unknown_token = unknown_token
+        self.start_token = start_token
+        self.end_token = end_token
+        self.vocabulary = set(model.vocabulary)
+        # Vocabulary positions break ties between equal counts in the continuation lists
+        self.word_order = {word: i for i, word in enumerate(model.vocabulary)}
+        # Online occurrences of words not (yet) in the vocabulary, and the sentences they occurred in
+        self.pending = {}
+        self.pending_sentences = {}
+        self.base_version = model.version
+        self.updates = 0
+        self.sentences_since_refresh = 0
+
+    def add_sentences(self, sentences):
+        """Folds tokenized sentences into the counts and tables; returns the words that joined the vocabulary."""
+        model = self.model
+        counts_list = model.n_gram_counts_list
+        touched = [set() for _ in counts_list]
+        new_words = self.promote_words(sentences, touched)
+        for sentence in sentences:
+            self.count_sentence(sentence, self.vocabulary, 1, touched)
+            for n in range(1, model.order + 1):
+                model.totals[n-1] += len(sentence) + 1
+
+        if model.tables is not None:
+            self.update_continuations(touched)
+            self.sentences_since_refresh += len(sentences)
+            if new_words or self.sentences_since_refresh >= RANKING_REFRESH_SENTENCES:
+                self.refresh_rankings()
+        self.updates += 1
+        model.version = f"{self.base_version}+{self.updates}"
+        return new_words
+
+    def count_sentence(self, sentence, vocabulary, sign, touched):
+        """Adds (sign=1) or removes (sign=-1) the N-grams of a sentence, with the words outside vocabulary as <UNK>."""
+        counts_list = self.model.n_gram_counts_list
+        tokens = [token if token in vocabulary else self.unknown_token for token in sentence]
+        for n in range(1, self.model.order + 1):
+            padded = [self.start_token] * (n - 1) + tokens + [self.end_token]
+            n_gram_counts = counts_list[n-1]
+            for i in range(len(padded) - n + 1):
+                n_gram = tuple(padded[i:i+n])
+                count = n_gram_counts.get(n_gram, 0) + sign
+                if count:
+                    n_gram_counts[n_gram] = count
+                else:
+                    del n_gram_counts[n_gram]
+                touched[n-1].add(n_gram)
+
+    def promote_words(self, sentences, touched):
+        """
+        Adds the words seen word_threshold times online to the vocabulary. The earlier sentences
+        they occurred in were counted with <UNK> in their place: they are counted again, at every
+        order, with the new words, so that no count stays behind under <UNK>.
+        """
+        seen = {}
+        for sentence in sentences:
+            for token in set(sentence):
+                if token not in self.vocabulary:
+                    seen.setdefault(token, []).append(sentence)
+        new_words = []
+        earlier_sentences = {}
+        for word, word_sentences in seen.items():
+            count = sum(sentence.count(word) for sentence in word_sentences)
+            earlier = self.pending.get(word, 0)
+            if earlier + count < self.word_threshold:
+                self.pending[word] = earlier + count
+                self.pending_sentences.setdefault(word, []).extend(word_sentences)
+                continue
+            self.pending.pop(word, None)
+            for sentence in self.pending_sentences.pop(word, []):
+                earlier_sentences[id(sentence)] = sentence
+            new_words.append(word)
+        if not new_words:
+            return new_words
+
+        old_vocabulary = set(self.vocabulary)
+        for word in new_words:
+            self.word_order[word] = len(self.model.vocabulary)
+            self.model.vocabulary.append(word)
+            self.vocabulary.add(word)
+        self.model.vocabulary_size = len(self.model.vocabulary) + 2
+        for sentence in earlier_sentences.values():
+            self.count_sentence(sentence, old_vocabulary, -1, touched)
+            self.count_sentence(sentence, self.vocabulary, 1, touched)
+        return new_words
+
+    def update_continuations(self, touched):
+        """Rebuilds the continuation list of every context with new (N+1)-grams, and the counts of touched contexts."""
+        counts_list = self.model.n_gram_counts_list
+        continuations = self.model.tables['continuations']
+        last = len(self.word_order)
+        for i, table in enumerate(continuations):
+            n_gram_counts, n_plus1_gram_counts = counts_list[i], counts_list[i+1]
+            changed = {}
+            for n_plus1_gram in touched[i+1]:
+                changed.setdefault(n_plus1_gram[:-1], set()).add(n_plus1_gram[-1])
+            for context, words in changed.items():
+                entry = table.get(context)
+                kept = [(w, c) for w, c in entry[1] if w not in words] if entry is not None else []
+                # Counts moved out of <UNK> by promote_words can drop to nothing
+                updated = kept + [(w, n_plus1_gram_counts[context + (w,)]) for w in words
+                                  if context + (w,) in n_plus1_gram_counts]
+                updated.sort(key=lambda x: (-x[1], self.word_order.get(x[0], last)))
+                if updated:
+                    table[context] = (n_gram_counts.get(context, 0), updated)
+                else:
+                    table.pop(context, None)
+            # Contexts whose own count changed without new continuations
+            for context in touched[i]:
+                entry = table.get(context)
+                if context not in changed and entry is not None:
+                    table[context] = (n_gram_counts.get(context, 0), entry[1])
+
+    def refresh_rankings(self):
+        tables = self.model.tables
+        unigram_ranking = build_unigram_ranking(self.model.n_gram_counts_list[0], self.model.vocabulary)
+        tables['prefix_index'] = build_prefix_index(unigram_ranking)
+        tables['unigram_ranking'] = unigram_ranking
+        self.sentences_since_refresh = 0
+
+    def save(self, filename):
+        tmp = filename + '.tmp'
+        save_model(self.model, tmp)
+        os.replace(tmp, filename)
+
+
+def write_atomically(filename, data):
+    """Pickles data next to filename and renames it into place, so a crash never leaves half a model."""
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(data, f)
+    os.replace(tmp, filename)
+
+# --- 2. Updates and Snapshots ---
+
+class OnlineUpdater:
+    """
+    Serializes updates of the live models and snapshots them to their pickle files: every
+    snapshot_seconds in a background thread (see start) and on demand.
+    """
+    def __init__(self, autocorrect=None, autocomplete=None, autocorrect_file=None, autocomplete_file=None):
+        self.autocorrect = autocorrect
+        self.autocomplete = autocomplete
+        self.autocorrect_file = autocorrect_file
+        self.autocomplete_file = autocomplete_file
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.sentences = self.words = self.snapshots = 0
+        self.last_snapshot = None
+        self.thread = None
+
+    def learn(self, text):
+        """Folds accepted text into both models; returns what changed."""
+        words = re.findall(r'\w+', text.lower())
+        sentences = tokenize_data(text) if self.autocomplete is not None else []
+        with self.lock:
+            new_words = self.autocorrect.add_words(words) if self.autocorrect is not None else []
+            new_tokens = self.autocomplete.add_sentences(sentences) if self.autocomplete is not None else []
+            self.sentences += len(sentences)
+            self.words += len(words)
+            self.dirty = True
+        return {
+            'words': len(words),
+            'sentences': len(sentences),
+            'new_autocorrect_words': new_words,
+            'new_autocomplete_words': new_tokens,
+        }
+
+    def snapshot(self):
+        """Writes the updated models to their files, if anything changed since the last snapshot."""
+        with self.lock:
+            if not self.dirty:
+                return False
+            start = time.perf_counter()
+            if self.autocorrect is not None and self.autocorrect_file:
+                self.autocorrect.save(self.autocorrect_file)
+            if self.autocomplete is not None and self.autocomplete_file:
+                self.autocomplete.save(self.autocomplete_file)
+            self.dirty = False
+            self.snapshots += 1
+            self.last_snapshot = time.time()
+        print(f"Snapshot of the updated models written in {time.perf_counter() - start:.2f}s")
+        return True
+
+    def start(self, snapshot_seconds=SNAPSHOT_SECONDS):
+        """Starts the background snapshot thread."""
+        if snapshot_seconds is None or self.thread is not None:
+            return
+        def run():
+            while True:
+                time.sleep(snapshot_seconds)
+                self.snapshot()
+        self.thread = threading.Thread(target=run, name="model-snapshots", daemon=True)
+        self.thread.start()
+
+    def stats(self):
+        return {
+            'sentences': self.sentences,
+            'words': self.words,
+            'snapshots': self.snapshots,
+            'last_snapshot': self.last_snapshot,
+            'pending_snapshot': self.dirty,
+            'autocomplete_version': self.autocomplete.model.version if self.autocomplete is not None else None,
+        }
@@ -0,0 +1,214 @@
+import math
+import random
+import heapq
+import numpy as np
+
+from Autocomplete_mod import count_all_n_grams
+
+# --- CONFIGURATION ---
+# Count-min sketch of every N-gram order: depth rows of width uint32 cells (4 x 2^20 = 16 MB per order)
+SKETCH_WIDTH = 2 ** 20
+SKETCH_DEPTH = 4
+# N-grams whose estimated count reaches this are kept with exact counts from then on
+SKETCH_MIN_COUNT = 2
+# Most N-grams kept per order; past it the least frequent tenth are dropped
+HEAVY_HITTERS_MAX = 2000000
+# Sentences whose N-grams are aggregated before they go into the sketch in one vectorized update
+SKETCH_BATCH_SENTENCES = 2000
+# Sentences sampled from the corpus for the error report
+SKETCH_SAMPLE_SENTENCES = 20000
+# ---------------------
+
+# --- 1. Count-Min Sketch ---
+#
+# A count-min sketch answers "how often was x seen" from depth rows of counters: x adds its count
+# to one cell per row, picked by a per-row hash, and the estimate is the smallest of its cells.
+# Collisions only add, so an estimate is never below the true count, and it is above it by at most
+# e / width of the total count with probability 1 - exp(-depth). Conservative update only raises
+# the cells that hold the minimum, which keeps the estimates much closer in practice.
+
+class CountMinSketch:
+    """Count-min sketch with conservative update over 64-bit item hashes."""
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, seed=0):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.uint32)
+        rng = np.random.default_rng(seed)
+        # Odd multipliers for multiply-shift hashing of the item hash, one per row
+        self.multipliers = rng.integers(1, 2 ** 63, size=(depth, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.rows = np.arange(depth)[:, None]
+
+    def cells(self, hashes):
+        """The (depth, len(hashes)) cell indices of uint64 item hashes."""
+        return ((self.multipliers * hashes[None, :]) >> np.uint64(32)) % np.uint64(self.width)
+
+    def add(self, hashes, counts):
+        """
+        Adds counts (uint32) to the items with the given hashes and returns their new estimates.
+        Every item's cells are raised to at least its old estimate plus its count, so estimates
+        stay upper bounds even when items of one batch share cells.
+        """
+        cells = self.cells(hashes)
+        estimates = self.table[self.rows, cells].min(axis=0).astype(np.uint64) + counts
+        estimates = np.minimum(estimates, np.iinfo(np.uint32).max).astype(np.uint32)
+        for row in range(self.depth):
+            np.maximum.at(self.table[row], cells[row], estimates)
+        return estimates
+
+    def error_bound(self, total):
+        """Overestimate that a count exceeds with probability at most exp(-depth)."""
+        return math.e / self.width * total
+
+    def nbytes(self):
+        return self.table.nbytes
+
+
+def item_hashes(items):
+    """64-bit hashes of hashable items, as uint64 (stable within one process)."""
+    return np.fromiter((hash(item) for item in items), dtype=np.int64, count=len(items)).view(np.uint64)
+
+# --- 2. Sketch-Backed N-gram Counting ---
+#
+# Unigrams are counted exactly: the words are few next to the N-grams, and apply_count_threshold
+# turns every word under the threshold into <UNK>, so dropping rare words would take the <UNK>
+# probability with them. Rare higher-order N-grams are still dropped, and with them the counts
+# that an exact build merges into <UNK> N-grams such as ('the', '<UNK>'); sketch_error_report
+# measures the share of each order's counts that is kept.
+
+class SketchNGramCounter:
+    """
+    Approximate raw N-gram counts of orders 2..max_n in fixed memory: one count-min sketch per
+    order, plus the heavy hitters, the N-grams whose estimate reached min_count, counted exactly
+    from then on (starting from that estimate). Unigrams are counted exactly. raw_counts_list()
+    returns the counts in the format of count_raw_n_grams_parallel; N-grams of order 2 and up
+    seen fewer than min_count times are dropped.
+    """
+    def __init__(self, max_n=4, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, min_count=SKETCH_MIN_COUNT,
+                 max_heavy_hitters=HEAVY_HITTERS_MAX, seed=0):
+        self.max_n = max_n
+        self.min_count = min_count
+        self.max_heavy_hitters = max_heavy_hitters
+        self.sketches = [None] + [CountMinSketch(width, depth, seed + n) for n in range(1, max_n)]
+        self.heavy = [{} for _ in range(max_n)]
+        self.batch = [{} for _ in range(max_n)]
+        self.totals = [0] * max_n
+        self.sentences = 0
+        self.evictions = 0
+
+    def add_sentences(self, sentences):
+        """Counts tokenized sentences (N-grams padded as count_n_grams pads them)."""
+        batch_sentences = []
+        for sentence in sentences:
+            batch_sentences.append(sentence)
+            if len(batch_sentences) == SKETCH_BATCH_SENTENCES:
+                self.add_batch(batch_sentences)
+                batch_sentences = []
+        if batch_sentences:
+            self.add_batch(batch_sentences)
+
+    def add_batch(self, sentences):
+        for n, n_gram_counts in enumerate(count_all_n_grams(sentences, self.max_n), start=1):
+            self.add_counts(n, n_gram_counts)
+        self.sentences += len(sentences)
+
+    def add_counts(self, n, n_gram_counts):
+        """Folds aggregated {n_gram: count} of order n into its sketch and heavy hitters."""
+        heavy = self.heavy[n-1]
+        if n == 1:
+            for n_gram, count in n_gram_counts.items():
+                heavy[n_gram] = heavy.get(n_gram, 0) + count
+            self.totals[0] += sum(n_gram_counts.values())
+            return
+        n_grams = list(n_gram_counts)
+        counts = np.fromiter(n_gram_counts.values(), dtype=np.uint32, count=len(n_grams))
+        estimates = self.sketches[n-1].add(item_hashes(n_grams), counts)
+        self.totals[n-1] += int(counts.sum(dtype=np.uint64))
+        min_count = self.min_count
+        for n_gram, count, estimate in zip(n_grams, counts.tolist(), estimates.tolist()):
+            if n_gram in heavy:
+                heavy[n_gram] += count
+            elif estimate >= min_count:
+                heavy[n_gram] = estimate
+        if len(heavy) > self.max_heavy_hitters:
+            # The sketch still holds the dropped counts: an N-gram that comes back is re-added at its estimate
+            kept = heapq.nlargest(self.max_heavy_hitters * 9 // 10, heavy.items(), key=lambda item: item[1])
+            self.evictions += len(heavy) - len(kept)
+            self.heavy[n-1] = dict(kept)
+
+    def raw_counts_list(self):
+        return [dict(heavy) for heavy in self.heavy]
+
+    def stats(self):
+        return {
+            'sentences': self.sentences,
+            'sketch_bytes': sum(sketch.nbytes() for sketch in self.sketches if sketch is not None),
+            'heavy_hitters': [len(heavy) for heavy in self.heavy],
+            'evictions': self.evictions,
+            'totals': self.totals,
+            'error_bounds': [sketch.error_bound(total) if sketch is not None else 0.0
+                             for sketch, total in zip(self.sketches, self.totals)],
+        }
+
+# --- 3. Error Report ---
+
+def reservoir_sample(sentences, sample, size=SKETCH_SAMPLE_SENTENCES, seed=0):
+    """Passes sentences through while keeping a uniform random sample of `size` of them in `sample`."""
+    rng = random.Random(seed)
+    for i, sentence in enumerate(sentences):
+        if i < size:
+            sample.append(sentence)
+        else:
+            j = rng.randint(0, i)
+            if j < size:
+                sample[j] = sentence
+        yield sentence
+
+def sketch_error_report(sample, counter):
+    """
+    Measures the error of a sketch build against exact counts on a sample of its corpus. The
+    sample is counted both ways, with the sketch width scaled down by the sample's share of the
+    corpus so that its cells are as loaded as in the full build. Per order: recall of the N-grams
+    seen at least min_count times, false positives, the overestimate of the counts kept, and the
+    share of the order's counts carried by the N-grams kept (the rest is missing from the <UNK>
+    N-grams an exact build would have).
+    """
+    share = len(sample) / counter.sentences if counter.sentences else 1.0
+    sketch = counter.sketches[1]
+    sampled = SketchNGramCounter(counter.max_n, max(64, int(sketch.width * share)), sketch.depth,
+                                 counter.min_count, max(1, int(counter.max_heavy_hitters * share)))
+    sampled.add_sentences(sample)
+    exact_list = count_all_n_grams(sample, counter.max_n)
+
+    report = {'sample_sentences': len(sample), 'sample_width': sampled.sketches[1].width, 'orders': {}}
+    for n, (exact, approximate) in enumerate(zip(exact_list, sampled.raw_counts_list()), start=1):
+        # Unigrams are all kept (see SketchNGramCounter)
+        frequent = {n_gram for n_gram, count in exact.items() if n == 1 or count >= counter.min_count}
+        errors = [count - exact[n_gram] for n_gram, count in approximate.items()]
+        relative = [error / exact[n_gram] for n_gram, error in zip(approximate, errors)]
+        total = sum(exact.values())
+        report['orders'][n] = {
+            'exact_entries': len(frequent),
+            'sketch_entries': len(approximate),
+            'recall': len(frequent & approximate.keys()) / len(frequent) if frequent else 1.0,
+            'false_positives': len(approximate.keys() - frequent),
+            'mean_overestimate': sum(errors) / len(errors) if errors else 0.0,
+            'mean_relative_overestimate': sum(relative) / len(relative) if relative else 0.0,
+            'max_overestimate': max(errors, default=0),
+            'mass_kept': sum(exact[n_gram] for n_gram in approximate) / total if total else 1.0,
+        }
+    return report
+
+def print_sketch_report(stats, report):
+    print(f"Sketched {stats['sentences']} sentences in {stats['sketch_bytes'] / 2**20:.0f} MB of sketches, "
+          f"{stats['evictions']} heavy hitters evicted")
+    for n, (kept, bound) in enumerate(zip(stats['heavy_hitters'], stats['error_bounds']), start=1):
+        if n == 1:
+            print(f"1-grams: {kept} counted exactly")
+        else:
+            print(f"{n}-grams: {kept} kept, overestimate <= {bound:.1f} with probability 1 - e^-depth")
+    print(f"Error against exact counts on a sample of {report['sample_sentences']} sentences "
+          f"(sketch width {report['sample_width']}):")
+    for n, order in report['orders'].items():
+        print(f"{n}-grams: recall {order['recall']:.2%}, {order['false_positives']} false positives, "
+              f"mean overestimate {order['mean_overestimate']:.3f} ({order['mean_relative_overestimate']:.2%}), "
+              f"max {order['max_overestimate']}, {order['mass_kept']:.2%} of the counts kept")
@@ -31,8 +31,8 @@ document.addEventListener("DOMContentLoaded", () => {
 
   async function fetchSuggestions() {
     const text = textbox.value.trim();
-    const words = text.split(/\s+/).filter(Boolean);
-    const lastWord = words.length ? words[words.length - 1] : "";
+    // Keep a trailing space: it tells the server the last word is finished
+    const fullText = textbox.value.trimStart();
 
     // Clear if empty input
     if (!text) {
@@ -40,10 +40,10 @@ document.addEventListener("DOMContentLoaded", () => {
       return;
     }
 
-    const cacheKey = text.toLowerCase();
+    const cacheKey = fullText.toLowerCase();
     const cached = getCached(cacheKey);
     if (cached) {
-      renderSuggestions(cached.autocorrect, cached.autocomplete, lastWord);
+      renderSuggestions(cached.autocorrect, cached.autocomplete, cached.completing);
       return;
     }
 
@@ -53,23 +53,19 @@ document.addEventListener("DOMContentLoaded", () => {
     const { signal } = abortController;
 
     try {
-      const [autocorrectResp, autocompleteResp] = await Promise.all([
-        fetch(`/autocorrect?word=${encodeURIComponent(lastWord)}`, { signal }),
-        fetch(`/autocomplete?prefix=${encodeURIComponent(text)}`, { signal }),
-      ]);
-
-      if (!autocorrectResp.ok || !autocompleteResp.ok) return;
-
-      const autocorrectData = await autocorrectResp.json();
-      const autocompleteData = await autocompleteResp.json();
+      // One request returns both the corrections for the last word and the completions
+      const resp = await fetch(`/suggest?text=${encodeURIComponent(fullText)}`, { signal });
+      if (!resp.ok) return;
 
+      const data = await resp.json();
       const result = {
-        autocorrect: autocorrectData.suggestions || [],
-        autocomplete: autocompleteData.suggestions || [],
+        autocorrect: data.autocorrect || [],
+        autocomplete: data.autocomplete || [],
+        completing: data.completing || "",
       };
 
       setCached(cacheKey, result);
-      renderSuggestions(result.autocorrect, result.autocomplete, lastWord);
+      renderSuggestions(result.autocorrect, result.autocomplete, result.completing);
     } catch (err) {
       if (err.name !== "AbortError") {
         console.error("Error fetching suggestions:", err);
@@ -79,7 +75,7 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   }
 
-  function renderSuggestions(autocorrectList, autocompleteList, lastWord) {
+  function renderSuggestions(autocorrectList, autocompleteList, completing) {
     suggestionsDiv.innerHTML = "";
 
     // Autocorrect suggestions (blue glow)
@@ -104,7 +100,14 @@ document.addEventListener("DOMContentLoaded", () => {
       btn.textContent = s;
       btn.classList.add("suggestion", "autocomplete");
       btn.addEventListener("click", () => {
-        textbox.value = textbox.value.trim() + " " + s + " ";
+        if (completing) {
+          // Finish the word being typed instead of appending a new one
+          const words = textbox.value.trim().split(/\s+/);
+          words[words.length - 1] = s;
+          textbox.value = words.join(" ") + " ";
+        } else {
+          textbox.value = textbox.value.trim() + " " + s + " ";
+        }
         suggestionsDiv.innerHTML = "";
         textbox.focus();
         debounceFetchSuggestions(true); // predict next word immediately
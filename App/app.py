@@ -2,9 +2,13 @@ import os
 import time
 import pickle
 import numpy as np
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, g
 from Autocorrect_mod import *
 from Autocomplete_mod import *
+from Modelfile_mod import load_model_autocorrect_file, load_model_file
+from Cache_mod import ResultCache, SharedCache
+from Metrics_mod import REGISTRY, CONTENT_TYPE, REQUEST_SECONDS, REQUESTS, EMPTY_RESULTS, ERRORS
+from Online_mod import OnlineAutocorrect, OnlineAutocomplete, OnlineUpdater
 
 # --- Paths & setup ---
 base_dir = os.path.abspath(os.path.dirname(__file__))
@@ -15,40 +19,213 @@ app = Flask(__name__, template_folder=template_folder, static_folder=static_fold
 MODEL_DIR = os.path.join(base_dir, 'data')
 MODEL_FILE1 = os.path.join(MODEL_DIR, "autocorrect_model_data.pkl")
 MODEL_FILE2 = os.path.join(MODEL_DIR, "autocomplete_model_data.pkl")
+# Memory-mapped model files (see Modelfile_mod.py), used instead of the pickles when present
+MODEL_BIN1 = os.path.join(MODEL_DIR, "autocorrect_model_data.bin")
+MODEL_BIN2 = os.path.join(MODEL_DIR, "autocomplete_model_data.bin")
+# Limits for /autocorrect/batch: words per request, and length above which a word gets no suggestions
+BATCH_MAX_WORDS = 1000
+BATCH_MAX_WORD_LENGTH = 40
+# Result caches (see Cache_mod.py); set SHARED_CACHE_FILE to share results between worker processes
+CACHE_MAX_ENTRIES = 50000
+CACHE_TTL = 600
+# Time budget of one autocorrect request (ms), shared by all the words of a batch and overridable per
+# request with ?deadline_ms=; None = unbounded
+AUTOCORRECT_DEADLINE_MS = 100
+# Correction engine: "delete_index" (symmetric-delete lookups), "edits" (every string one and two
+# edits away) or "trie" (bounded Levenshtein search of a vocabulary trie, see get_corrections_by_trie)
+AUTOCORRECT_ENGINE = "delete_index"
+# Rank corrections with keyboard-adjacency substitution costs (see get_corrections_by_med); the
+# "edits" engine also tries the likeliest edits first, the "delete_index" engine only ranks
+AUTOCORRECT_KEYBOARD = False
+# Autocomplete scorer, "laplace" or "backoff" (see NGramModel.suggest); overridable with ?scorer=
+AUTOCOMPLETE_SCORER = "laplace"
+SHARED_CACHE_FILE = None  # e.g. os.path.join(MODEL_DIR, "suggest_cache.sqlite")
+# Online updates (POST /learn, see Online_mod.py) load the pickles unpacked and snapshot them every
+# SNAPSHOT_SECONDS; LEARN_MAX_CHARS bounds the text of one request
+ONLINE_UPDATES = False
+SNAPSHOT_SECONDS = 300
+LEARN_MAX_CHARS = 100000
 
 # --- Model loading ---
-vocab, probs = set(), {}
-vocabulary, n_gram_counts_list = set(), []
+vocab, probs, delete_index = set(), {}, None
+vocab_trie = None
+autocorrect_version = None
+ngram_model = None
 
 try:
     print("Loading Autocorrect model...")
-    vocab, probs = load_model_autocorrect(MODEL_FILE1)
+    # Online updates need writable models, so the memory-mapped files are skipped
+    loaded = MODEL_BIN1 if os.path.exists(MODEL_BIN1) and not ONLINE_UPDATES else MODEL_FILE1
+    if loaded == MODEL_BIN1:
+        vocab, probs, delete_index = load_model_autocorrect_file(MODEL_BIN1)
+    else:
+        vocab, probs, delete_index = load_model_autocorrect(MODEL_FILE1, with_index=True, with_counts=ONLINE_UPDATES)
+    # The autocorrect files carry no version: identify them by modification time and size
+    autocorrect_version = f"{int(os.path.getmtime(loaded))}-{os.path.getsize(loaded)}"
     print(f"Autocorrect model loaded. Vocab size: {len(vocab)}")
+    if AUTOCORRECT_ENGINE == "trie":
+        vocab_trie = build_vocab_trie(vocab)
+    elif AUTOCORRECT_ENGINE == "edits" and not isinstance(vocab, set):
+        # The edits engine checks thousands of strings per word: a set beats binary searches of the mapped table
+        vocab = set(vocab)
 except Exception as e:
     print(f"Error loading autocorrect model: {e}")
 
 try:
     print("Loading Autocomplete model...")
-    vocabulary, n_gram_counts_list = load_model(MODEL_FILE2)
-    print(f"Autocomplete model loaded. Vocabulary size: {len(vocabulary)}")
+    if os.path.exists(MODEL_BIN2) and not ONLINE_UPDATES:
+        ngram_model = load_model_file(MODEL_BIN2)
+    else:
+        # Packed counts keep the N-gram tables in NumPy arrays, several times smaller than dicts
+        ngram_model = load_model(MODEL_FILE2, packed=not ONLINE_UPDATES)
+    print(f"Autocomplete model loaded. Vocabulary size: {len(ngram_model.vocabulary)}")
 except Exception as e:
     print(f"Error loading autocomplete model: {e}")
 
+online_updater = None
+if ONLINE_UPDATES:
+    try:
+        online_autocorrect = OnlineAutocorrect(vocab, probs, delete_index) if vocab else None
+        online_autocomplete = OnlineAutocomplete(ngram_model) if ngram_model is not None else None
+        online_updater = OnlineUpdater(online_autocorrect, online_autocomplete, MODEL_FILE1, MODEL_FILE2)
+        if online_autocorrect is not None:
+            # Probabilities are now divided out of the live counts on lookup
+            probs = online_autocorrect.probs
+        online_updater.start(SNAPSHOT_SECONDS)
+    except Exception as e:
+        print(f"Error enabling online updates: {e}")
+
+# --- Result caches ---
+shared_cache = SharedCache(SHARED_CACHE_FILE) if SHARED_CACHE_FILE else None
+autocorrect_cache = ResultCache("autocorrect", version=autocorrect_version, max_entries=CACHE_MAX_ENTRIES,
+                                ttl=CACHE_TTL, shared=shared_cache)
+autocomplete_cache = ResultCache("autocomplete", version=getattr(ngram_model, "version", None),
+                                max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, shared=shared_cache)
+
 # --- Core functions ---
-def autocorrect(word):
+def autocorrect(word, deadline=None):
+    """
+    Returns (suggestions, partial): partial is True when the deadline (a time.perf_counter() value,
+    see request_deadline) passed before the search finished. Partial results are not cached.
+    """
     if not vocab or not probs:
-        return []
-    return get_corrections_by_med(word.lower(), probs, vocab=vocab, n=3, verbose=False, display_matrix=False)[:3]
+        return [], False
+    word = word.lower()
+    suggestions = autocorrect_cache.get(word)
+    if suggestions is not None:
+        return suggestions, False
+    # Past the deadline only cached results come back (a batch shares one deadline)
+    if deadline is not None and time.perf_counter() > deadline:
+        return [], True
+    if AUTOCORRECT_ENGINE == "trie":
+        # The trie search is bounded by TRIE_MAX_EDITS rather than by time
+        suggestions, partial = get_corrections_by_trie(word, probs, vocab_trie, n=3, verbose=False), False
+    else:
+        index = delete_index if AUTOCORRECT_ENGINE == "delete_index" else None
+        suggestions, partial = get_corrections_by_med_until(word, probs, vocab, deadline, n=3, verbose=False,
+                                                            delete_index=index, keyboard=AUTOCORRECT_KEYBOARD)
+    if not partial:
+        autocorrect_cache.put(word, suggestions)
+    return suggestions, partial
+
+
+def autocorrect_batch(words, deadline=None):
+    """
+    (suggestions, partial) for every word in order, computed once per distinct (lowercased) word.
+    The deadline is shared: once it passes, the remaining words only get cached results.
+    """
+    corrections = {}
+    for word in words:
+        key = word.lower()
+        if key not in corrections:
+            corrections[key] = autocorrect(key, deadline) if 0 < len(key) <= BATCH_MAX_WORD_LENGTH else ([], False)
+    return [corrections[word.lower()] for word in words]
+
+
+def request_deadline():
+    """
+    The time.perf_counter() value at which the autocorrect budget of the current request runs out:
+    ?deadline_ms= (or AUTOCORRECT_DEADLINE_MS) after the request started; None = unbounded.
+    """
+    deadline_ms = request.args.get("deadline_ms", type=float)
+    if deadline_ms is None or deadline_ms <= 0:
+        deadline_ms = AUTOCORRECT_DEADLINE_MS
+    return g.request_start + deadline_ms / 1000 if deadline_ms is not None else None
+
+
+def request_scorer():
+    """The ?scorer= of the current request, or AUTOCOMPLETE_SCORER."""
+    scorer = request.args.get("scorer")
+    return scorer if scorer in ("laplace", "backoff") else AUTOCOMPLETE_SCORER
 
 
-def generate_autocomplete(prefix):
-    """Predict the next possible word(s) after the current sequence."""
+def split_partial_word(text):
+    """Split text into context tokens and the word still being typed ("" after a trailing space)."""
+    tokens = text.lower().split()
+    if tokens and not text[-1].isspace():
+        return tokens[:-1], tokens[-1]
+    return tokens, ""
+
+
+def generate_autocomplete(prefix, scorer=AUTOCOMPLETE_SCORER):
+    """Complete the word being typed, or predict the next word(s) after a trailing space."""
     if not prefix.strip():
         return []
-    tokens = prefix.lower().split()
-    # Predict *next* words, not words starting with the last token
-    suggestions_with_probs = get_suggestions(tokens, n_gram_counts_list, vocabulary, k=1.0, start_with=None)
-    return [s[0] for s in suggestions_with_probs[:5]]
+    return autocomplete_tokens(*split_partial_word(prefix), scorer=scorer)
+
+
+def autocomplete_tokens(tokens, partial, scorer=AUTOCOMPLETE_SCORER):
+    """generate_autocomplete for text already split by split_partial_word."""
+    if ngram_model is None:
+        return []
+    # Only the last (order - 1) tokens reach the model, so they, the partial word and the scorer make the key
+    context = (['<s>'] * (ngram_model.order - 1) + tokens)[-(ngram_model.order - 1):]
+    autocomplete_cache.set_version(ngram_model.version)
+    return autocomplete_cache.get_or_compute((tuple(context), partial, scorer), lambda: complete(tokens, partial, scorer))
+
+
+def complete(tokens, partial, scorer):
+    # Words under the typed prefix, ranked by the context before it; the prefix itself is not a completion
+    suggestions_with_probs = ngram_model.suggest(tokens, k=1.0, start_with=partial or None, n_suggestions=6, scorer=scorer)
+    return [s[0] for s in suggestions_with_probs if s[0] != partial][:5]
+
+# --- Request metrics ---
+def route_label():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def note_empty(*results):
+    """Marks the current request as having returned no suggestions when all results are empty."""
+    if not any(results):
+        g.empty_result = True
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    route = route_label()
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, route=route)
+    REQUESTS.inc(route=route, status=str(response.status_code))
+    if response.status_code >= 500:
+        ERRORS.inc(route=route)
+    if g.get("empty_result"):
+        EMPTY_RESULTS.inc(route=route)
+    g.recorded = True
+    return response
+
+
+@app.teardown_request
+def record_failure(exc):
+    # Exceptions propagated without a response (e.g. in debug mode) never reach after_request
+    if exc is not None and not g.get("recorded") and "request_start" in g:
+        route = route_label()
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, route=route)
+        REQUESTS.inc(route=route, status="500")
+        ERRORS.inc(route=route)
 
 # --- Routes ---
 @app.route("/")
@@ -60,9 +237,25 @@ def index():
 def autocorrect_api():
     word = request.args.get("word", "")
     if not word:
-        return jsonify({"suggestions": []}), 200
-    suggestions = autocorrect(word)
-    return jsonify({"suggestions": suggestions}), 200
+        return jsonify({"suggestions": [], "partial": False}), 200
+    suggestions, partial = autocorrect(word, request_deadline())
+    note_empty(suggestions)
+    return jsonify({"suggestions": suggestions, "partial": partial}), 200
+
+
+@app.route("/autocorrect/batch", methods=["POST"])
+def autocorrect_batch_api():
+    payload = request.get_json(silent=True) or {}
+    words = payload.get("words") if isinstance(payload, dict) else None
+    if not isinstance(words, list) or not all(isinstance(word, str) for word in words):
+        return jsonify({"error": "expected a JSON body of the form {\"words\": [...]}"}), 400
+    if len(words) > BATCH_MAX_WORDS:
+        return jsonify({"error": f"at most {BATCH_MAX_WORDS} words per request"}), 413
+    # One time budget for the whole batch
+    results = [{"word": word, "suggestions": suggestions, "partial": partial}
+               for word, (suggestions, partial) in zip(words, autocorrect_batch(words, request_deadline()))]
+    note_empty(*(result["suggestions"] for result in results))
+    return jsonify({"results": results}), 200
 
 
 @app.route("/autocomplete", methods=["GET"])
@@ -70,8 +263,59 @@ def autocomplete_api():
     prefix = request.args.get("prefix", "")
     if not prefix:
         return jsonify({"suggestions": []}), 200
-    predictions = generate_autocomplete(prefix)
-    return jsonify({"suggestions": predictions}), 200
+    predictions = generate_autocomplete(prefix, request_scorer())
+    note_empty(predictions)
+    return jsonify({"suggestions": predictions, "completing": split_partial_word(prefix)[1]}), 200
+
+
+@app.route("/learn", methods=["POST"])
+def learn_api():
+    """Folds accepted text into the live models (see Online_mod.py)."""
+    global vocab_trie
+    if online_updater is None:
+        return jsonify({"error": "online updates are disabled"}), 403
+    payload = request.get_json(silent=True) or {}
+    text = payload.get("text") if isinstance(payload, dict) else None
+    if not isinstance(text, str):
+        return jsonify({"error": "expected a JSON body of the form {\"text\": \"...\"}"}), 400
+    if len(text) > LEARN_MAX_CHARS:
+        return jsonify({"error": f"at most {LEARN_MAX_CHARS} characters per request"}), 413
+    result = online_updater.learn(text)
+    if vocab_trie is not None and result["new_autocorrect_words"]:
+        with online_updater.lock:
+            vocab_trie = add_to_vocab_trie(vocab_trie, result["new_autocorrect_words"], copy=True)
+    if result["words"]:
+        # Every learned word shifts the probabilities that rank the corrections
+        autocorrect_cache.set_version(f"{autocorrect_version}+{online_updater.words}")
+    return jsonify({**result, "stats": online_updater.stats()}), 200
+
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats_api():
+    return jsonify({"autocorrect": autocorrect_cache.stats(), "autocomplete": autocomplete_cache.stats()}), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_api():
+    return REGISTRY.render(), 200, {"Content-Type": CONTENT_TYPE}
+
+
+@app.route("/suggest", methods=["GET"])
+def suggest_api():
+    """Corrections for the last word and completions/predictions for the text, in one request."""
+    text = request.args.get("text", "")
+    tokens, partial = split_partial_word(text)
+    if not tokens and not partial:
+        return jsonify({"autocorrect": [], "autocomplete": [], "completing": "", "partial": False}), 200
+    corrections, cut_short = autocorrect(partial or tokens[-1], request_deadline())
+    predictions = autocomplete_tokens(tokens, partial, request_scorer())
+    note_empty(corrections, predictions)
+    return jsonify({
+        "autocorrect": corrections,
+        "autocomplete": predictions,
+        "completing": partial,
+        "partial": cut_short,
+    }), 200
 
 
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+"""
+Regression check of suggest_backoff at the start of a sentence, on dict and packed counts.
+
+With no previous tokens the contexts are all start tokens, which the lower-order tables never count
+on their own; the suggestions must still follow how sentences start, not the unigram frequencies.
+
+    python backoff_check.py
+"""
+import sys
+
+from Autocomplete_mod import (count_n_grams, build_suggestion_tables, pack_n_gram_counts_list, suggest_backoff,
+                              count_total)
+
+# 12 sentences: 'a' starts 3 of them, 'cat' and 'sat' are the most frequent words but start none
+SENTENCES = (
+    [["a", "cat", "sat"]] * 3 +
+    [["the", "cat", "sat", "cat", "sat"]] * 5 +
+    [["dogs", "sat", "cat"]] * 4
+)
+EXPECTED = ["the", "dogs", "a"]
+
+
+def check_sentence_start(n_gram_counts_list, vocabulary):
+    """Returns the words suggest_backoff proposes for an empty context."""
+    tables = build_suggestion_tables(vocabulary, n_gram_counts_list)
+    suggestions = suggest_backoff([], n_gram_counts_list, tables, count_total(n_gram_counts_list[0]), n_suggestions=3)
+    return [word for word, _ in suggestions]
+
+
+if __name__ == "__main__":
+    vocabulary = sorted({word for sentence in SENTENCES for word in sentence})
+    counts_list = [count_n_grams(SENTENCES, n) for n in range(1, 5)]
+    failures = 0
+    for name, n_gram_counts_list in (("dict", counts_list), ("packed", pack_n_gram_counts_list(counts_list, vocabulary))):
+        words = check_sentence_start(n_gram_counts_list, vocabulary)
+        ok = words == EXPECTED
+        failures += not ok
+        print(f"{name}: {words} {'ok' if ok else f'expected {EXPECTED}'}")
+    sys.exit(1 if failures else 0)
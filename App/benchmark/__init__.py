@@ -0,0 +1,8 @@
+"""
+Reproducible benchmarks of the autocorrect and autocomplete hot paths.
+
+Both models are trained on a synthetic Zipfian corpus (see corpus.py) so the numbers do not depend
+on the data files, and the report is JSON for comparing commits. Run from the App directory:
+
+    python -m benchmark --sentences 20000 --vocab 20000 --output bench.json
+"""
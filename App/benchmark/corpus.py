@@ -0,0 +1,69 @@
+import random
+import itertools
+
+# --- CONFIGURATION ---
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+# Zipf exponent of the word frequencies (about 1 for English text)
+ZIPF_EXPONENT = 1.1
+# Word lengths are drawn uniformly from this range; sentence lengths likewise, in words
+WORD_LENGTHS = (2, 12)
+SENTENCE_LENGTHS = (4, 20)
+# ---------------------
+
+
+def make_vocabulary(n_words, seed=0, lengths=WORD_LENGTHS):
+    """Returns n_words distinct random lowercase words, in frequency rank order."""
+    rng = random.Random(seed)
+    words = []
+    seen = set()
+    while len(words) < n_words:
+        word = ''.join(rng.choice(LETTERS) for _ in range(rng.randint(*lengths)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def zipf_cumulative_weights(n_words, exponent=ZIPF_EXPONENT):
+    """Cumulative weights of ranks 1..n_words under Zipf's law, for random.choices."""
+    return list(itertools.accumulate(1.0 / rank ** exponent for rank in range(1, n_words + 1)))
+
+
+def generate_sentences(n_sentences, vocabulary, seed=0, exponent=ZIPF_EXPONENT, lengths=SENTENCE_LENGTHS):
+    """Yields n_sentences sentences of Zipf-distributed words, each ending with a period."""
+    rng = random.Random(seed)
+    cum_weights = zipf_cumulative_weights(len(vocabulary), exponent)
+    for _ in range(n_sentences):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(*lengths))
+        yield ' '.join(words) + ' .'
+
+
+def write_corpus(filename, n_sentences, vocab_size, seed=0, exponent=ZIPF_EXPONENT):
+    """Writes a synthetic corpus, one sentence per line, in the layout of the training data."""
+    vocabulary = make_vocabulary(vocab_size, seed)
+    with open(filename, 'w', encoding='utf-8') as f:
+        for sentence in generate_sentences(n_sentences, vocabulary, seed, exponent):
+            f.write(sentence + '\n')
+    return filename
+
+
+def make_typo(word, distance, rng, neighbours=None):
+    """
+    Applies `distance` random deletes, inserts, replaces or switches to word. With neighbours,
+    a {letter: nearby keys} map, inserted and replacing letters are keys next to the letter hit.
+    """
+    for _ in range(distance):
+        edit = rng.choice(('delete', 'insert', 'replace', 'switch') if len(word) > 1 else ('insert', 'replace'))
+        i = rng.randrange(len(word))
+        if edit == 'delete':
+            word = word[:i] + word[i + 1:]
+        elif edit == 'insert':
+            near = neighbours.get(word[i]) if neighbours else None
+            word = word[:i] + rng.choice(near or LETTERS) + word[i:]
+        elif edit == 'replace':
+            near = neighbours.get(word[i]) if neighbours else None
+            word = word[:i] + rng.choice(near or LETTERS.replace(word[i], '')) + word[i + 1:]
+        else:
+            i = min(i, len(word) - 2)
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word
@@ -0,0 +1,253 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+import subprocess
+import numpy as np
+
+from Autocorrect_mod import (stream_words, get_count, get_probs, build_delete_index, get_corrections_by_med,
+                             save_model_autocorrect, load_model_autocorrect, keyboard_neighbours,
+                             build_vocab_trie, get_corrections_by_trie)
+from Autocomplete_mod import (tokenize_sentences, get_words_with_nplus_frequency, replace_oov_words_by_unk,
+                              count_n_grams, build_suggestion_tables, NGramModel, save_model, load_model)
+from Metrics_mod import AUTOCORRECT_CANDIDATES
+from Modelfile_mod import (save_model_autocorrect_file, load_model_autocorrect_file, save_model_file,
+                           load_model_file)
+from .corpus import write_corpus, make_typo
+
+# --- CONFIGURATION ---
+# Word length buckets (inclusive) and typo distances for the autocorrect benchmark
+WORD_LENGTH_BUCKETS = ((2, 4), (5, 7), (8, 10), (11, 12))
+TYPO_DISTANCES = (0, 1, 2)
+# Typos with random letters, or with letters next to the key hit
+TYPO_KINDS = ("random", "keyboard")
+# Context lengths (in words) for the autocomplete benchmark
+CONTEXT_LENGTHS = (0, 1, 2, 3, 4)
+SCORERS = ("laplace", "backoff")
+# ---------------------
+
+
+# --- 1. Timing ---
+
+def measure(fn, calls, repeat=1):
+    """Times fn(*args) for every args in calls, `repeat` times over; returns latency statistics in ms."""
+    times = []
+    for _ in range(repeat):
+        for args in calls:
+            start = time.perf_counter()
+            fn(*args)
+            times.append((time.perf_counter() - start) * 1000)
+    if not times:
+        return {'calls': 0}
+    times.sort()
+    return {
+        'calls': len(times),
+        'mean_ms': statistics.fmean(times),
+        'median_ms': statistics.median(times),
+        'p95_ms': times[int(0.95 * (len(times) - 1))],
+        'min_ms': times[0],
+        'max_ms': times[-1],
+    }
+
+
+def quietly(fn, *args, **kwargs):
+    """Calls fn with its progress prints suppressed."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+# --- 2. Model Building ---
+
+def build_models(corpus_file, count_threshold, max_n):
+    """Trains both models on the corpus like the training modes do; returns them with stage timings."""
+    timings = {}
+    start = time.perf_counter()
+    word_counts = get_count(stream_words(corpus_file))
+    vocab, probs = set(word_counts), get_probs(word_counts)
+    timings['autocorrect_counts_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    delete_index = build_delete_index(vocab)
+    timings['delete_index_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    trie = build_vocab_trie(vocab)
+    timings['vocab_trie_s'] = time.perf_counter() - start
+
+    with open(corpus_file, encoding='utf-8') as f:
+        sentences = [line.strip() for line in f if line.strip()]
+    start = time.perf_counter()
+    # The fast tokenizer gives nltk's tokens without needing the punkt data installed
+    tokenized = tokenize_sentences(sentences, mode="fast")
+    timings['tokenize_s'] = time.perf_counter() - start
+
+    vocabulary = get_words_with_nplus_frequency(tokenized, count_threshold)
+    data = replace_oov_words_by_unk(tokenized, vocabulary)
+    n_gram_counts_list = [count_n_grams(data, n) for n in range(1, max_n + 1)]
+    start = time.perf_counter()
+    tables = build_suggestion_tables(vocabulary, n_gram_counts_list)
+    timings['suggestion_tables_s'] = time.perf_counter() - start
+
+    autocorrect_model = (vocab, probs, delete_index)
+    model = NGramModel(vocabulary, n_gram_counts_list, tables=tables, version="benchmark")
+    return autocorrect_model, trie, model, data, timings
+
+
+# --- 3. Benchmarks ---
+
+def bench_autocorrect(vocab, probs, delete_index, trie, samples, rng):
+    """
+    Autocorrect latency per word length bucket, typo kind and distance, for every engine:
+    get_corrections_by_med with and without the index and the keyboard costs, and the trie search.
+    top1/hit_rate are the share of calls whose first / top 3 suggestions hold the intended word,
+    mean_candidates the candidate strings (trie nodes for the trie) checked per call.
+    """
+    words = sorted(vocab)
+    neighbours = keyboard_neighbours()
+    engines = {
+        engine: (lambda w, index=index, keyboard=keyboard:
+                 get_corrections_by_med(w, probs, vocab, verbose=False, delete_index=index, keyboard=keyboard))
+        for engine, index, keyboard in (('edits', None, False), ('edits_keyboard', None, True),
+                                        ('delete_index', delete_index, False),
+                                        ('delete_index_keyboard', delete_index, True))
+    }
+    engines['trie'] = lambda w: get_corrections_by_trie(w, probs, trie, verbose=False)
+    results = []
+    for low, high in WORD_LENGTH_BUCKETS:
+        bucket = [w for w in words if low <= len(w) <= high]
+        if not bucket:
+            continue
+        for kind in TYPO_KINDS:
+            for distance in TYPO_DISTANCES:
+                intended = [rng.choice(bucket) for _ in range(samples)]
+                typos = [make_typo(w, distance, rng, neighbours if kind == 'keyboard' else None) for w in intended]
+                for engine, correct in engines.items():
+                    calls, checked = AUTOCORRECT_CANDIDATES.totals(engine=engine)
+                    stats = measure(correct, [(w,) for w in typos])
+                    calls_after, checked_after = AUTOCORRECT_CANDIDATES.totals(engine=engine)
+                    suggestions = [correct(w) for w in typos]
+                    results.append({'word_length': f"{low}-{high}", 'typo_kind': kind, 'typo_distance': distance,
+                                    'engine': engine,
+                                    'top1': sum(s[:1] == [w] for s, w in zip(suggestions, intended)) / samples,
+                                    'hit_rate': sum(w in s for s, w in zip(suggestions, intended)) / samples,
+                                    'mean_candidates': (checked_after - checked) / max(calls_after - calls, 1),
+                                    **stats})
+    return results
+
+
+def bench_suggestions(model, data, samples, rng):
+    """
+    model.suggest latency per scorer and context length, for next-word prediction and completion,
+    with hit_rate: the share of calls whose top 5 holds the word that actually came next.
+    """
+    results = []
+    for length in CONTEXT_LENGTHS:
+        # Contexts and next words taken from the training sentences
+        pool = [s for s in data if len(s) > length and s[length] != '<UNK>']
+        picks = [rng.choice(pool) for _ in range(samples)]
+        for mode in ('next_word', 'completion'):
+            calls = [(s[:length], s[length][:2] if mode == 'completion' else None) for s in picks]
+            for scorer in SCORERS:
+                suggest = lambda tokens, prefix: model.suggest(tokens, start_with=prefix, scorer=scorer)
+                stats = measure(suggest, calls)
+                hits = sum(s[length] in [w for w, _ in suggest(*call)] for s, call in zip(picks, calls))
+                results.append({'context_length': length, 'mode': mode, 'scorer': scorer,
+                                'hit_rate': hits / len(calls), **stats})
+    return results
+
+
+def bench_counting(data, max_n):
+    """count_n_grams time over the whole tokenized corpus, per order."""
+    return [{'n': n, **measure(count_n_grams, [(data, n)])} for n in range(1, max_n + 1)]
+
+
+def bench_load(autocorrect_model, model, workdir, repeat):
+    """Load time of both models from their pickle and memory-mapped files."""
+    vocab, probs, delete_index = autocorrect_model
+    files = {name: os.path.join(workdir, name) for name in ('autocorrect.pkl', 'autocorrect.bin',
+                                                            'autocomplete.pkl', 'autocomplete.bin')}
+    quietly(save_model_autocorrect, vocab, probs, files['autocorrect.pkl'], delete_index=delete_index)
+    quietly(save_model_autocorrect_file, vocab, probs, delete_index, files['autocorrect.bin'])
+    quietly(save_model, model, files['autocomplete.pkl'])
+    quietly(save_model_file, quietly(load_model, files['autocomplete.pkl'], packed=True), files['autocomplete.bin'])
+
+    loaders = {
+        'autocorrect_pickle': ('autocorrect.pkl', lambda f: quietly(load_model_autocorrect, f, with_index=True)),
+        'autocorrect_mmap': ('autocorrect.bin', lambda f: quietly(load_model_autocorrect_file, f)),
+        'autocomplete_pickle': ('autocomplete.pkl', lambda f: quietly(load_model, f)),
+        'autocomplete_pickle_packed': ('autocomplete.pkl', lambda f: quietly(load_model, f, packed=True)),
+        'autocomplete_mmap': ('autocomplete.bin', lambda f: quietly(load_model_file, f)),
+    }
+    return [{'loader': name, 'file_bytes': os.path.getsize(files[file]), **measure(loader, [(files[file],)], repeat)}
+            for name, (file, loader) in loaders.items()]
+
+
+# --- 4. Main ---
+
+def git_commit():
+    """The commit of the checkout being benchmarked, if it can be found."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    """Builds the models on a fresh synthetic corpus and runs every benchmark; returns the JSON report."""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus_file = write_corpus(os.path.join(workdir, 'corpus.txt'), args.sentences, args.vocab, args.seed)
+        autocorrect_model, trie, model, data, build_timings = build_models(corpus_file, args.count_threshold, args.max_n)
+        vocab, probs, delete_index = autocorrect_model
+        results = {
+            'build': build_timings,
+            'get_corrections_by_med': bench_autocorrect(vocab, probs, delete_index, trie, args.samples, rng),
+            'get_suggestions': bench_suggestions(model, data, args.samples, rng),
+            'count_n_grams': bench_counting(data, args.max_n),
+            'model_load': bench_load(autocorrect_model, model, workdir, args.repeat),
+        }
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'config': vars(args),
+            'autocorrect_vocab': len(vocab),
+            'autocomplete_vocab': len(model.vocabulary),
+            'n_gram_totals': model.totals,
+        },
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark",
+                                     description="Times the autocorrect and autocomplete hot paths on a synthetic Zipfian corpus.")
+    parser.add_argument("--sentences", type=int, default=20000, help="sentences in the synthetic corpus")
+    parser.add_argument("--vocab", type=int, default=20000, help="distinct words the corpus draws from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--samples", type=int, default=20, help="timed calls per benchmark case")
+    parser.add_argument("--repeat", type=int, default=3, help="timed loads per model file")
+    parser.add_argument("--max-n", type=int, default=4, help="highest N-gram order")
+    parser.add_argument("--count-threshold", type=int, default=2, help="minimum count of an autocomplete word")
+    parser.add_argument("--output", help="JSON report file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Benchmark report written to {args.output}", file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,138 @@
+"""
+Parity check and benchmark of the fast tokenizer against nltk's word_tokenize.
+
+The fast tokenizer is checked against FIXTURE_FILE, the tokens nltk gave for a fixed set of sentences
+when it was generated (--write-fixture; regenerate it after upgrading nltk or its data). Then both
+tokenizers are run through tokenize_sentences on a synthetic corpus mixing common words with
+contractions, abbreviations, numbers, quotes and brackets; every sentence must give the same tokens.
+Both need the punkt data (nltk.download('punkt_tab')).
+
+    python tokenizer_check.py --sentences 50000 --seed 0
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import nltk
+
+from Autocomplete_mod import tokenize_sentences, tokenize_chunk
+
+COMMON_WORDS = (
+    "the of and to a in is you that it he was for on are as with his they i at be this have from "
+    "or one had by word but not what all were we when your can said there use an each which she do how"
+).split()
+TRICKY_WORDS = [
+    "can't", "won't", "don't", "i'm", "they're", "we'll", "she'd", "o'neill", "rock'n'roll", "'tis", "'twas",
+    "cannot", "gonna", "wanna", "gimme", "lemme", "gotta", "well-known", "e-mail", "--", "foo--bar",
+    "3.14", "1,000", "$5", "50%", "2019.", "#tag", "@user", "&", "x:y", "a;b", "...", "<b>",
+    "u.s.", "e.g.", "i.e.", "etc.", "mr.", "dr.", "a.", "c.", "end.", "done.", "it's.", "bob's.",
+    "hello,", "yes!", "no?", "!?", "(hello)", "[x]", "{y}", "end.)", '"quote"', "'single'", "``", "''",
+    '"', "'", "“hi”", "«ok»",
+]
+# Sentences that once tokenized differently, checked on every run
+REGRESSION_SENTENCES = [
+    "by it's. with him",
+    "ask bob's. he knows",
+    "Dr. o'neill's. then",
+    "2019. \" at had you",
+    "It there and 3.14 i.e. he ' it's. '' be but there and c. 'twas this",
+    "But what won't had was or your are mr. each there a. !? i.e. (hello) to not each his we with",
+]
+FIXTURE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tokenizer_fixture.json")
+FIXTURE_SENTENCES = 400
+
+
+def synthetic_sentences(n_sentences, seed=0, tricky_share=0.3):
+    """Random sentences of 1-25 words, tricky_share of them drawn from TRICKY_WORDS."""
+    rng = random.Random(seed)
+    sentences = []
+    for _ in range(n_sentences):
+        words = [rng.choice(TRICKY_WORDS) if rng.random() < tricky_share else rng.choice(COMMON_WORDS)
+                 for _ in range(rng.randint(1, 25))]
+        if rng.random() < 0.5:
+            words[0] = words[0].capitalize()
+        sentences.append(" ".join(words))
+    return sentences
+
+
+def fixture_sentences(seed=0):
+    """The sentences of the fixture: the regression sentences, synthetic ones and lines of several of them."""
+    rng = random.Random(seed)
+    sentences = synthetic_sentences(FIXTURE_SENTENCES, seed)
+    lines = [" ".join(sentences[i:i+2]) + rng.choice([". ", "? ", "! ", ".) ", '. " ']) + sentences[i+2] + "."
+             for i in range(0, len(sentences) - 2, 5)]
+    return REGRESSION_SENTENCES + sentences + lines
+
+
+def write_fixture(filename=FIXTURE_FILE):
+    """Records the nltk tokens of fixture_sentences in filename."""
+    sentences = fixture_sentences()
+    fixture = {"nltk_version": nltk.__version__,
+               "cases": [{"text": text, "tokens": tokens}
+                         for text, tokens in zip(sentences, tokenize_sentences(sentences, mode="nltk"))]}
+    # One case per line, so that regenerating it gives a readable diff
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write('{"nltk_version": %s, "cases": [\n' % json.dumps(fixture["nltk_version"]))
+        f.write(",\n".join(json.dumps(case, ensure_ascii=False) for case in fixture["cases"]))
+        f.write("\n]}\n")
+    return len(sentences)
+
+
+def check_fixture(filename=FIXTURE_FILE, show=5):
+    """Returns the fixture sentences the fast tokenizer splits differently from the recorded nltk tokens."""
+    with open(filename, encoding="utf-8") as f:
+        cases = json.load(f)["cases"]
+    actual = tokenize_sentences([case["text"] for case in cases], mode="fast")
+    mismatches = [case for case, tokens in zip(cases, actual) if tokens != case["tokens"]]
+    for case in mismatches[:show]:
+        print(f"  {case['text']!r}\n    nltk: {case['tokens']}\n    fast: {tokenize_sentences([case['text']], mode='fast')[0]}")
+    return mismatches
+
+
+def check_parity(sentences, show=5):
+    """Returns the sentences tokenized differently by the two modes, printing the first few."""
+    expected = tokenize_sentences(sentences, mode="nltk")
+    actual = tokenize_sentences(sentences, mode="fast")
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+    for i in mismatches[:show]:
+        print(f"  {sentences[i]!r}\n    nltk: {expected[i]}\n    fast: {actual[i]}")
+    return mismatches
+
+
+def benchmark(sentences, mode, repeat=3):
+    """Best wall time over `repeat` runs of tokenize_sentences, starting from an empty chunk cache."""
+    best = float('inf')
+    for _ in range(repeat):
+        tokenize_chunk.cache_clear()
+        start = time.perf_counter()
+        tokenize_sentences(sentences, mode=mode)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the fast tokenizer with nltk's word_tokenize.")
+    parser.add_argument("--sentences", type=int, default=20000, help="synthetic sentences to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="benchmark runs per tokenizer")
+    parser.add_argument("--write-fixture", action="store_true", help="record nltk's tokens in the fixture and exit")
+    args = parser.parse_args()
+
+    if args.write_fixture:
+        print(f"{write_fixture()} sentences written to {FIXTURE_FILE} (nltk {nltk.__version__})")
+        sys.exit(0)
+
+    fixture_mismatches = check_fixture()
+    print(f"Fixture: {len(fixture_mismatches)} sentences tokenized differently from the recorded nltk tokens")
+
+    sentences = REGRESSION_SENTENCES + synthetic_sentences(args.sentences, args.seed)
+    mismatches = check_parity(sentences)
+    print(f"Parity: {len(sentences) - len(mismatches)}/{len(sentences)} sentences identical")
+
+    nltk_time = benchmark(sentences, "nltk", args.repeat)
+    fast_time = benchmark(sentences, "fast", args.repeat)
+    print(f"nltk: {nltk_time:.3f}s  fast: {fast_time:.3f}s  speedup: {nltk_time / fast_time:.1f}x")
+    sys.exit(1 if mismatches or fixture_mismatches else 0)